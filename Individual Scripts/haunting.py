@@ -1,8 +1,6 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-import tkinter as tk
-from tkinter import filedialog
+import sys
 from PIL import Image
 
 # Function to parse, visualize, and export textures from file
@@ -82,25 +80,33 @@ def visualize_and_export_textures(file_path):
                     clut_file.write(bytes(color))
             print(f"Exported processed CLUT for texture {idx + 1} as {clut_output_file}")
 
-            # Prepare expanded pixel array for RGBA
-            expanded_pixels = np.zeros((height, width, 4), dtype=np.uint8)
-
-            # Map the pixel data using the twiddled CLUT
+            # Map the pixel data through the twiddled CLUT in one lookup
+            clut = np.zeros((256, 4), dtype=np.uint8)
+            if clut_data:
+                clut[:len(clut_data)] = np.array(clut_data, dtype=np.uint8)
+            count = width * height
+            data = np.frombuffer(pixel_data, dtype=np.uint8)
+            indices = np.zeros(count, dtype=np.uint8)
+            mask = np.zeros(count, dtype=bool)
             if bpp == 4:
-                for i in range(pixel_data_size):
-                    low_nibble = pixel_data[i] & 0x0F
-                    high_nibble = (pixel_data[i] & 0xF0) >> 4
-                    y, x = divmod(2 * i, width)
-                    if y < height:
-                        if low_nibble < len(clut_data):
-                            expanded_pixels[y, x] = clut_data[low_nibble]
-                        if x + 1 < width and high_nibble < len(clut_data):
-                            expanded_pixels[y, x + 1] = clut_data[high_nibble]
+                # Low nibble is the left pixel; a high nibble that would wrap
+                # onto the next row (odd widths) is dropped
+                stream = np.empty(data.size * 2, dtype=np.uint8)
+                stream[0::2] = data & 0x0F
+                stream[1::2] = data >> 4
+                n = min(stream.size, count)
+                indices[:n] = stream[:n]
+                mask[:n] = True
+                if width % 2:
+                    wrapped = np.arange(width, n, width)
+                    mask[wrapped[wrapped % 2 == 1]] = False
             else:
-                for i in range(pixel_data_size):
-                    pixel_value = pixel_data[i]
-                    if pixel_value < len(clut_data):
-                        expanded_pixels[i // width, i % width] = clut_data[pixel_value]
+                n = min(data.size, count)
+                indices[:n] = data[:n]
+                mask[:n] = True
+            expanded_pixels = clut[indices]
+            expanded_pixels[~mask] = 0
+            expanded_pixels = expanded_pixels.reshape(height, width, 4)
 
             # Create BMP file with indexed colors
             bmp_output_file = f"{os.path.splitext(os.path.basename(file_path))[0]}_texture{idx + 1}.bmp"
@@ -109,12 +115,23 @@ def visualize_and_export_textures(file_path):
             image.save(bmp_output_file, format='BMP')
             print(f"Exported texture {idx + 1} as {bmp_output_file}")
 
-# File selection dialog to select a file dynamically
-root = tk.Tk()
-root.withdraw()  # Hide the main tkinter window
-file_path = filedialog.askopenfilename(title="Select a Texture File", filetypes=[("Texture Files", "*.TEX"), ("All Files", "*.*")])
+# Export the TEX file given on the command line, or pick one with a file
+# dialog; Tk is only loaded (and its root window created) for the dialog
+def main():
+    if len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    else:
+        import tkinter as tk
+        from tkinter import filedialog
+
+        root = tk.Tk()
+        root.withdraw()  # Hide the main tkinter window
+        file_path = filedialog.askopenfilename(title="Select a Texture File", filetypes=[("Texture Files", "*.TEX"), ("All Files", "*.*")])
+
+    if file_path:
+        visualize_and_export_textures(file_path)
+    else:
+        print("No file selected.")
 
-if file_path:
-    visualize_and_export_textures(file_path)
-else:
-    print("No file selected.")
+if __name__ == "__main__":
+    main()
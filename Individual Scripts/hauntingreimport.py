@@ -1,12 +1,9 @@
 import re
+import sys
 import numpy as np
 from PIL import Image
-import tkinter as tk
-from tkinter import filedialog
 
 def import_textures(bmp_files, reference_tex_file, output_tex_file):
-    textures_data = []
-
     # Sort bmp_files based on numbers in filenames
     def extract_number(filename):
         match = re.search(r'(\d+)', filename)
@@ -30,16 +27,32 @@ def import_textures(bmp_files, reference_tex_file, output_tex_file):
         print("Not enough headers in the reference TEX file for the number of BMP files.")
         exit()
 
+    # Lay out the whole output file from the BMP dimensions and reference
+    # format flags alone; opening an image only reads its header
+    layout = []
+    data_offset = 0x10 + len(bmp_files) * 16  # Offset written to the headers
+    position = data_offset  # Where the packed data actually goes
+    for idx, bmp_file in enumerate(bmp_files):
+        with Image.open(bmp_file) as image:
+            width, height = image.size
+        format_flag_value = int.from_bytes(reference_headers[idx][0:4], 'little')
+        bpp = 4 if format_flag_value == 0x14 else 8  # Assume 0x14 means 4bpp
+        packed_size = height * ((width + 1) // 2) if bpp == 4 else width * height  # 4bpp rows padded to a byte
+        layout.append((format_flag_value, width, height, bpp, data_offset, position, packed_size))
+        data_offset += (width * height) // (2 if bpp == 4 else 1) + 1024  # Pixel data size + CLUT size
+        position += packed_size + 1024
+
+    # Preallocate the output file and pack every texture straight into it
+    tex_data = bytearray(position)
+    tex_data[0:1] = len(bmp_files).to_bytes(1, 'big')
+
     for idx, bmp_file in enumerate(bmp_files):
+        format_flag_value, width, height, bpp, data_offset, position, packed_size = layout[idx]
+        is_4bpp = bpp == 4
+
         # Load the BMP image and ensure it's in palette mode to access indices and palette
         image = Image.open(bmp_file).convert('P')
-        width, height = image.size
         pixels = np.array(image)
-        
-        # Check format flag from the reference header
-        reference_header = reference_headers[idx]
-        format_flag_value = int.from_bytes(reference_header[0:4], 'little')
-        is_4bpp = format_flag_value == 0x14  # Assume 0x14 means 4bpp
 
         # Invert grayscale values for BMP to TEX format compatibility
         pixels = 255 - pixels
@@ -70,7 +83,6 @@ def import_textures(bmp_files, reference_tex_file, output_tex_file):
 
             # Pad the CLUT to 1024 bytes
             padded_clut = combined_clut + [(0x00, 0x00, 0x00, 0x00)] * (256 - len(combined_clut))
-            bpp = 4
         else:
             # Use full 8bpp CLUT without additional padding
             clut_entries = flipped_clut  # Already flipped, contains 256 entries
@@ -81,99 +93,72 @@ def import_textures(bmp_files, reference_tex_file, output_tex_file):
                 clut_twiddled.extend(clut_entries[i+8:i+16])  # Colors 8-15
                 clut_twiddled.extend(clut_entries[i+24:i+32]) # Colors 24-31
             padded_clut = clut_twiddled  # Already 1024 bytes for 8bpp
-            bpp = 8
-
-        # Convert indexed pixels to binary format based on bits per pixel
-        pixel_data = bytearray()
-        if bpp == 4:
-            # Pack two 4-bit indices per byte for 4bpp format
-            for y in range(height):
-                for x in range(0, width, 2):
-                    low_nibble = pixels[y, x] & 0x0F
-                    high_nibble = (pixels[y, x + 1] & 0x0F) if (x + 1) < width else 0
-                    pixel_data.append((high_nibble << 4) | low_nibble)
-        else:  # 8bpp format
-            for y in range(height):
-                for x in range(width):
-                    pixel_data.append(pixels[y, x])
-
-        # Extract the unknown bytes from the reference header
-        unknown_bytes = reference_header[8:12]
-
-        # Store all texture data for later processing
-        textures_data.append({
-            'format_flag_value': format_flag_value,
-            'width': width,
-            'height': height,
-            'bpp': bpp,
-            'pixel_data': pixel_data,
-            'clut_data': padded_clut,
-            'unknown_bytes': unknown_bytes
-        })
-
-    # Start writing the new TEX file
+
+        # Create texture header, keeping the unknown bytes from the reference header
+        header_offset = 0x10 + idx * 16
+        header = bytearray(16)
+        header[0:4] = format_flag_value.to_bytes(4, 'little')
+        header[4:6] = width.to_bytes(2, 'little')
+        header[6:8] = height.to_bytes(2, 'little')
+        header[8:12] = reference_headers[idx][8:12]
+        header[12:16] = (data_offset - header_offset).to_bytes(4, 'little')  # Relative data offset
+        tex_data[header_offset:header_offset + 16] = header
+
+        # Pack the indexed pixels straight into the output buffer
+        dest = np.frombuffer(tex_data, dtype=np.uint8, count=packed_size, offset=position)
+        if is_4bpp:
+            # Two 4-bit indices per byte as (high << 4) | low, odd widths padded with 0
+            dest = dest.reshape(height, (width + 1) // 2)
+            np.bitwise_and(pixels[:, 0::2], 0x0F, out=dest)
+            dest[:, :width // 2] |= (pixels[:, 1::2] & 0x0F) << 4
+        else:
+            dest[:] = pixels.reshape(-1)
+        del dest
+
+        clut_start = position + packed_size
+        tex_data[clut_start:clut_start + 1024] = b''.join(bytes(color) for color in padded_clut)
+
+    # Write the new TEX file
     with open(output_tex_file, 'wb') as out_file:
-        num_textures = len(textures_data)
-        out_file.write(num_textures.to_bytes(1, 'big'))
-        out_file.write(b'\x00' * 15)  # Fill the rest up to 0x10
-
-        headers = []
-        data_offset = 0x10 + num_textures * 16  # Initial data offset after headers
-
-        # First pass: Write headers and calculate offsets
-        for idx, tex in enumerate(textures_data):
-            format_flag_value = tex['format_flag_value']
-            width = tex['width']
-            height = tex['height']
-            bpp = tex['bpp']
-            pixel_data_size = (width * height) // (2 if bpp == 4 else 1)
-
-            # Create texture header
-            header = bytearray(16)
-            header[0:4] = format_flag_value.to_bytes(4, 'little')
-            header[4:6] = width.to_bytes(2, 'little')
-            header[6:8] = height.to_bytes(2, 'little')
-            header[8:12] = tex['unknown_bytes']  # Include unknown bytes
-            header[12:16] = (data_offset - (0x10 + idx * 16)).to_bytes(4, 'little')  # Relative data offset
-
-            headers.append(header)
-
-            # Update data offset for next texture
-            data_offset += pixel_data_size + 1024  # Pixel data size + CLUT size
-
-        # Second pass: Write headers
-        for header in headers:
-            out_file.write(header)
-
-        # Third pass: Write pixel data and CLUTs
-        for tex in textures_data:
-            out_file.write(tex['pixel_data'])
-            for color in tex['clut_data']:
-                out_file.write(bytes(color))
+        out_file.write(tex_data)
 
     print(f"\nTextures imported and saved to {output_tex_file}")
 
-# File selection dialogs
-root = tk.Tk()
-root.withdraw()  # Hide the main tkinter window
-
-# Select multiple BMP files
-bmp_files = filedialog.askopenfilenames(title="Select BMP files to import", filetypes=[("BMP Files", "*.bmp")])
-if not bmp_files:
-    print("No BMP files selected.")
-    exit()
-
-# Select the reference TEX file
-reference_tex_file = filedialog.askopenfilename(title="Select the reference TEX file", filetypes=[("TEX Files", "*.tex")])
-if not reference_tex_file:
-    print("No reference TEX file selected.")
-    exit()
-
-# Select the output TEX file path
-output_tex_file = filedialog.asksaveasfilename(title="Save the output TEX file", defaultextension=".tex", filetypes=[("TEX Files", "*.tex")])
-if not output_tex_file:
-    print("No output file path selected.")
-    exit()
-
-# Run the import process
-import_textures(bmp_files, reference_tex_file, output_tex_file)
+# Import with the files given on the command line (reference TEX, output TEX,
+# then the BMP files), or pick them with file dialogs; Tk is only loaded for
+# the dialogs
+def main():
+    if len(sys.argv) > 3:
+        reference_tex_file, output_tex_file = sys.argv[1:3]
+        import_textures(sys.argv[3:], reference_tex_file, output_tex_file)
+        return
+
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.withdraw()  # Hide the main tkinter window
+
+    # Select multiple BMP files
+    bmp_files = filedialog.askopenfilenames(title="Select BMP files to import", filetypes=[("BMP Files", "*.bmp")])
+    if not bmp_files:
+        print("No BMP files selected.")
+        return
+
+    # Select the reference TEX file
+    reference_tex_file = filedialog.askopenfilename(title="Select the reference TEX file", filetypes=[("TEX Files", "*.tex")])
+    if not reference_tex_file:
+        print("No reference TEX file selected.")
+        return
+
+    # Select the output TEX file path
+    output_tex_file = filedialog.asksaveasfilename(title="Save the output TEX file", defaultextension=".tex", filetypes=[("TEX Files", "*.tex")])
+    if not output_tex_file:
+        print("No output file path selected.")
+        return
+
+    # Run the import process
+    import_textures(bmp_files, reference_tex_file, output_tex_file)
+
+if __name__ == "__main__":
+    main()
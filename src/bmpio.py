@@ -0,0 +1,52 @@
+import struct
+
+import numpy as np
+
+
+# Pillow only writes 8-bit palettized BMPs, so 4-bit ones are written here.
+# Writes a palettized BMP a band of rows at a time: the headers and palette go
+# out first, then each band is packed and written straight to its place in
+# the file, so only one band is ever held in memory. Rows stay bottom-up as
+# most readers expect; palette is an (N, 3) RGB array with up to 2**bpp colors.
+class IndexedBmpWriter:
+    def __init__(self, path, width, height, palette, bpp):
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        num_colors = 1 << bpp
+        self.row_size = (width * bpp + 31) // 32 * 4  # Rows are padded to 4 bytes
+        self.pixel_offset = 14 + 40 + num_colors * 4
+        image_size = self.row_size * height
+
+        # Palette entries are stored as BGRX
+        bgrx = np.zeros((num_colors, 4), dtype=np.uint8)
+        bgrx[:len(palette), :3] = np.asarray(palette, dtype=np.uint8)[:num_colors, ::-1]
+
+        self._file = open(path, 'wb')
+        self._file.write(b'BM' + struct.pack('<IHHI', self.pixel_offset + image_size, 0, 0, self.pixel_offset))
+        self._file.write(struct.pack('<IiiHHIIiiII', 40, width, height, 1, bpp, 0, image_size,
+                                     2835, 2835, num_colors, num_colors))
+        self._file.write(bgrx.tobytes())
+        self._file.truncate(self.pixel_offset + image_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    # Write a (rows, width) band of indices whose top row is image row y
+    def write_rows(self, y, indices):
+        rows = np.zeros((len(indices), self.row_size), dtype=np.uint8)
+        if self.bpp == 4:
+            # At 4bpp the left pixel is the high nibble
+            rows[:, :(self.width + 1) // 2] = (indices[:, 0::2] & 0x0F) << 4
+            rows[:, :self.width // 2] |= indices[:, 1::2] & 0x0F
+        else:
+            rows[:, :self.width] = indices
+        # Bottom-up: the band's last row comes first in the file
+        self._file.seek(self.pixel_offset + (self.height - y - len(indices)) * self.row_size)
+        self._file.write(rows[::-1].tobytes())
@@ -0,0 +1,108 @@
+import numpy as np
+
+# TEX CLUTs are stored in blocks of 8 colors with the middle two blocks of
+# every 32 swapped: colors 0-7, 16-23, 8-15, 24-31. SWIZZLE[i] is the stored
+# entry that holds color i, UNSWIZZLE is its inverse (the swap is its own
+# inverse, but both directions are spelled out for clarity).
+SWIZZLE = np.arange(256).reshape(8, 4, 8)[:, [0, 2, 1, 3]].reshape(256)
+UNSWIZZLE = np.argsort(SWIZZLE)
+
+
+# Stored CLUT entries -> color order. A truncated CLUT with fewer than 256
+# entries yields just the colors it holds, in the same order as a full one.
+def unswizzle(clut):
+    if len(clut) == 256:
+        return clut[SWIZZLE]
+    return clut[SWIZZLE[SWIZZLE < len(clut)]]
+
+
+# Color order -> stored CLUT entries
+def swizzle(clut):
+    return clut[UNSWIZZLE]
+
+
+# PS2 alpha runs 0-0x80; double it for export, clamped to 255
+def scale_alpha(clut):
+    scaled = clut.copy()
+    scaled[:, 3] = np.minimum(clut[:, 3].astype(np.uint16) * 2, 255)
+    return scaled
+
+
+# RGB colors -> RGBA with alpha 0x80 for every color except black
+def alpha_from_rgb(rgb):
+    rgba = np.zeros((len(rgb), 4), dtype=np.uint8)
+    rgba[:, :3] = rgb
+    rgba[:, 3] = np.where(rgb.any(axis=1), 0x80, 0x00)
+    return rgba
+
+
+# Raw (N, 4) TEX CLUT -> the processed colors export writes to _clut.bin
+# and decodes with: unswizzled, alpha scaled
+def export_clut(clut):
+    return scale_alpha(unswizzle(np.asarray(clut, dtype=np.uint8).reshape(-1, 4)))
+
+
+# Alpha of a _clut.bin sidecar (as written by export) -> raw TEX alpha. Export
+# doubles alpha and clamps it to 255, so 255 stands for 0x80 (or anything above,
+# which can't be told apart) and everything else halves exactly.
+def alpha_from_sidecar(sidecar):
+    alpha = sidecar[:, 3] // 2
+    alpha[sidecar[:, 3] == 255] = 0x80
+    return alpha
+
+
+# 24-bit keys for RGB colors (any shape ending in 3)
+def rgb_keys(rgb):
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+# Alpha for TEX colors (in color order) taken from an exported sidecar: a color
+# still at its own index (an indexed export) keeps that entry's alpha, any
+# other color found in the sidecar takes the alpha of its first occurrence and
+# the rest keep the given default
+def match_alpha(rgb, sidecar, default):
+    alpha = default.copy()
+    sidecar_alpha = alpha_from_sidecar(sidecar)
+
+    sidecar_keys = rgb_keys(sidecar[:, :3])
+    order = np.argsort(sidecar_keys, kind='stable')
+    sorted_keys = sidecar_keys[order]
+    keys = rgb_keys(rgb)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    found = sorted_keys[positions] == keys
+    alpha[found] = sidecar_alpha[order[positions[found]]]
+
+    count = min(len(rgb), len(sidecar))
+    same = (sidecar[:count, :3] == rgb[:count]).all(axis=1)
+    alpha[:count][same] = sidecar_alpha[:count][same]
+    return alpha
+
+
+# BMP palette (flat RGB list) -> the (256, 4) TEX CLUT written on import.
+# The first num_colors colors are flipped (BMP index i is TEX index
+# num_colors - 1 - i), given the 0x80 alpha rule, padded to 256 entries and
+# swizzled, which also puts the 32-byte gap after the first 8 colors of a
+# 16-color CLUT. Colors missing from a short palette are black.
+# With the texture's exported _clut.bin (bytes or array), alpha comes from it
+# instead of the black rule and the entries past num_colors (the padding of a
+# 16-color CLUT) are restored from it, so unedited textures round-trip exactly.
+# out is an optional (256, 4) uint8 array to build the CLUT in.
+def import_clut(palette, num_colors, sidecar=None, out=None):
+    rgb = np.zeros((num_colors, 3), dtype=np.uint8)
+    colors = np.asarray(palette[:num_colors * 3], dtype=np.uint8).reshape(-1, 3)
+    rgb[:len(colors)] = colors
+
+    clut = np.zeros((256, 4), dtype=np.uint8)
+    if sidecar is not None:
+        sidecar = np.frombuffer(sidecar, dtype=np.uint8) if isinstance(sidecar, bytes) else np.asarray(sidecar)
+        sidecar = sidecar[:sidecar.size // 4 * 4].reshape(-1, 4)[:256]
+        clut[:len(sidecar), :3] = sidecar[:, :3]
+        clut[:len(sidecar), 3] = alpha_from_sidecar(sidecar)
+    clut[:num_colors] = alpha_from_rgb(rgb)[::-1]
+    if sidecar is not None and len(sidecar):
+        clut[:num_colors, 3] = match_alpha(clut[:num_colors, :3], sidecar, clut[:num_colors, 3])
+
+    if out is None:
+        return swizzle(clut)
+    return np.take(clut, UNSWIZZLE, axis=0, out=out)
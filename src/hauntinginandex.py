@@ -1,131 +1,137 @@
-import numpy as np
+import argparse
+import glob
+import json
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox
-from PIL import Image
-import re
-
-# Function to parse, visualize, and export textures from file
-def visualize_and_export_textures():
-    
+import shutil
+import sys
+
+# Everything heavier (numpy and PIL through hgtex, tkinter, the thread pool) is
+# imported by the code path that needs it, so a command starts quickly; see
+# texbench.py startup
+import texprof
+
+# Raised from a progress callback to stop a conversion
+class Cancelled(Exception):
+    pass
+
+# Runs one conversion at a time on a background thread so the window stays
+# responsive. The worker reports progress through a queue that the Tk thread
+# polls with root.after (Tk must only be touched from its own thread), and
+# cancel() makes the next progress callback raise Cancelled.
+class TaskRunner:
+    def __init__(self, root, progress_bar, status_label, buttons, cancel_button):
+        import queue
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.root = root
+        self.progress_bar = progress_bar
+        self.status_label = status_label
+        self.buttons = buttons
+        self.cancel_button = cancel_button
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.root.after(50, self.poll)
+
+    # Run function(*args, progress=callback) in the background, then show
+    # done_message (a (title, text) pair) when it finishes
+    def start(self, function, args, done_message):
+        self.cancel_event.clear()
+        for button in self.buttons:
+            button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.progress_bar.config(value=0, maximum=1)
+        self.status_label.config(text="Working...")
+        self.executor.submit(self.run, function, args, done_message)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.status_label.config(text="Cancelling...")
+
+    # Worker thread: only talks to the UI through the queue
+    def run(self, function, args, done_message):
+        def progress(done, total):
+            self.messages.put(('progress', done, total))
+            if self.cancel_event.is_set():
+                raise Cancelled()
+
+        try:
+            function(*args, progress=progress)
+            self.messages.put(('done',) + done_message)
+        except Cancelled:
+            self.messages.put(('cancelled',))
+        except Exception as e:
+            self.messages.put(('error', str(e)))
+
+    # UI thread: drain the queue and update the window
+    def poll(self):
+        import queue
+        from tkinter import messagebox
+
+        try:
+            while True:
+                message = self.messages.get_nowait()
+                if message[0] == 'progress':
+                    done, total = message[1:]
+                    self.progress_bar.config(value=done, maximum=total)
+                    self.status_label.config(text=f"Texture {done} of {total}")
+                    continue
+                if message[0] == 'done':
+                    self.status_label.config(text="Done")
+                    messagebox.showinfo(message[1], message[2])
+                elif message[0] == 'cancelled':
+                    self.status_label.config(text="Cancelled")
+                else:
+                    self.status_label.config(text="Failed")
+                    messagebox.showerror("Error", message[1])
+                for button in self.buttons:
+                    button.config(state='normal')
+                self.cancel_button.config(state='disabled')
+        except queue.Empty:
+            pass
+        self.root.after(50, self.poll)
+
+    def shutdown(self):
+        self.cancel_event.set()
+        self.executor.shutdown(wait=True)
+
+# Run a conversion on the runner if there is one, otherwise right away
+def run_task(runner, function, args, done_message):
+    if runner is not None:
+        runner.start(function, args, done_message)
+        return
+
+    from tkinter import messagebox
+
+    try:
+        function(*args)
+        messagebox.showinfo(*done_message)
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+
+# Function to pick a TEX file and export its textures
+def visualize_and_export_textures(runner=None):
+    from tkinter import filedialog
+    from hgtex import export_tex
+
     file_path = filedialog.askopenfilename(
         title="Select a Texture File to Export",
         filetypes=[("Texture Files", "*.TEX"), ("All Files", "*.*")]
     )
-    
+
     if not file_path:
         print("No file selected for export.")
         return
 
-    
-    try:
-        with open(file_path, 'rb') as file:
-            # Read the number of textures
-            num_textures = int.from_bytes(file.read(1), 'big')
-            print(f"Number of textures: {num_textures}")
-            file.seek(0x10)  # Move to the start of the first texture header
-    
-            # Read all texture headers then determine data positions
-            headers = []
-            data_offsets = []
-            for i in range(num_textures):
-                header = file.read(16)
-                headers.append(header)
-                print(f"Header {i + 1}: {header.hex()}")
-    
-                # Extract the data position relative to the start of this header
-                relative_data_offset = int.from_bytes(header[12:16], 'little')
-                data_offsets.append(0x10 + i * 16 + relative_data_offset)
-                print(f"Data offset for texture {i + 1}: {hex(data_offsets[-1])}")
-    
-            for idx, header in enumerate(headers):
-                # Extract properties
-                format_flag = header[0x00:0x04]
-                format_flag_value = int.from_bytes(format_flag, 'little')
-                width = int.from_bytes(header[0x04:0x06], 'little')
-                height = int.from_bytes(header[0x06:0x08], 'little')
-                print(f"\nTexture {idx + 1} dimensions: {width}x{height}")
-                print(f"Format flag value: {format_flag_value}")
-    
-                # Bits per pixel based on the format flag
-                if format_flag_value == 0x13:
-                    bpp = 8
-                elif format_flag_value == 0x14:
-                    bpp = 4
-                else:
-                    raise ValueError(f"Unsupported format flag: {format_flag_value}")
-                print(f"Bits per pixel for texture {idx + 1}: {bpp}")
-    
-                # Calculate pixel data size based on bpp
-                pixel_data_size = (width * height) // (2 if bpp == 4 else 1)
-                print(f"Pixel data size for texture {idx + 1}: {pixel_data_size} bytes")
-    
-                # Read the pixel data from the offset specified in the header
-                file.seek(data_offsets[idx])
-                pixel_data = file.read(pixel_data_size)
-    
-                # Read CLUT if applicable (starting after pixel data)
-                clut_start_offset = data_offsets[idx] + pixel_data_size
-                clut_size = 1024  # 256 colors * 4 bytes per color (RGBA)
-                print(f"CLUT for texture {idx + 1} starts at: {hex(clut_start_offset)}, size: {clut_size} bytes")
-                file.seek(clut_start_offset)
-                clut_data_raw = file.read(clut_size)
-    
-                # Parse CLUT data into RGBA colors and scale alpha
-                clut_entries = [clut_data_raw[i:i+4] for i in range(0, len(clut_data_raw), 4)]
-                clut_twiddled = []
-                for i in range(0, 256, 32):
-                    clut_twiddled.extend(clut_entries[i:i+8])    # 0-7
-                    clut_twiddled.extend(clut_entries[i+16:i+24]) # 16-23
-                    clut_twiddled.extend(clut_entries[i+8:i+16])  # 8-15
-                    clut_twiddled.extend(clut_entries[i+24:i+32]) # 24-31
-                
-                # Scale alpha and construct RGBA colors
-                clut_data = [
-                    (entry[0], entry[1], entry[2], min(entry[3] * 2, 255))  # Scale alpha by 2
-                    for entry in clut_twiddled
-                ]
-    
-                # Export the processed CLUT data
-                clut_output_file = f"{os.path.splitext(os.path.basename(file_path))[0]}_texture{idx + 1}_clut.bin"
-                with open(clut_output_file, 'wb') as clut_file:
-                    for color in clut_data:
-                        clut_file.write(bytes(color))
-                print(f"Exported processed CLUT for texture {idx + 1} as {clut_output_file}")
-    
-                # Prepare expanded pixel array for RGBA
-                expanded_pixels = np.zeros((height, width, 4), dtype=np.uint8)
-    
-                # Map the pixel data using the twiddled CLUT
-                if bpp == 4:
-                    for i in range(pixel_data_size):
-                        low_nibble = pixel_data[i] & 0x0F
-                        high_nibble = (pixel_data[i] & 0xF0) >> 4
-                        y, x = divmod(2 * i, width)
-                        if y < height:
-                            if low_nibble < len(clut_data):
-                                expanded_pixels[y, x] = clut_data[low_nibble]
-                            if x + 1 < width and high_nibble < len(clut_data):
-                                expanded_pixels[y, x + 1] = clut_data[high_nibble]
-                else:
-                    for i in range(pixel_data_size):
-                        pixel_value = pixel_data[i]
-                        if pixel_value < len(clut_data):
-                            expanded_pixels[i // width, i % width] = clut_data[pixel_value]
-    
-                # Create BMP file with indexed colors
-                bmp_output_file = f"{os.path.splitext(os.path.basename(file_path))[0]}_texture{idx + 1}.bmp"
-                image = Image.fromarray(expanded_pixels[..., :3], 'RGB')
-                image = image.convert('P', palette=Image.ADAPTIVE, colors=256)  # Convert to indexed BMP
-                image.save(bmp_output_file, format='BMP')
-                print(f"Exported texture {idx + 1} as {bmp_output_file}")
-    
-        messagebox.showinfo("Export Complete", "Textures have been exported successfully.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    run_task(runner, export_tex, (file_path,),
+             ("Export Complete", "Textures have been exported successfully."))
 
 # Function to import textures from BMP files and create a TEX file
-def import_textures():
+def import_textures(runner=None):
+    from tkinter import filedialog
+    from hgtex import import_tex
+
     # Select multiple BMP files
     bmp_files = filedialog.askopenfilenames(
         title="Select BMP files to import",
@@ -134,16 +140,16 @@ def import_textures():
     if not bmp_files:
         print("No BMP files selected.")
         return
-    
+
     # Select the reference TEX file
     reference_tex_file = filedialog.askopenfilename(
         title="Select the reference TEX file",
-        filetypes=[("TEX Files", "*.tex")]
+        filetypes=[("TEX Files", "*.tex"), ("Texture Info", "*.texinfo.json")]
     )
     if not reference_tex_file:
         print("No reference TEX file selected.")
         return
-    
+
     # Select the output TEX file path
     output_tex_file = filedialog.asksaveasfilename(
         title="Save the output TEX file",
@@ -154,177 +160,500 @@ def import_textures():
         print("No output file path selected.")
         return
 
-    # Rest of your import function...
-    try:
-        textures_data = []
-
-        # Sort bmp_files based on numbers in filenames
-        def extract_number(filename):
-            match = re.search(r'(\d+)', filename)
-            return int(match.group(1)) if match else 0
-
-        bmp_files = sorted(bmp_files, key=lambda x: extract_number(x))
-
-        # Open the reference TEX file to read headers and unknown bytes
-        with open(reference_tex_file, 'rb') as ref_file:
-            num_textures_ref = int.from_bytes(ref_file.read(1), 'big')
-            ref_file.seek(0x10)  # Move to the start of the first texture header
-
-            # Read all headers from the reference TEX file
-            reference_headers = []
-            for i in range(num_textures_ref):
-                header = ref_file.read(16)
-                reference_headers.append(header)
-
-        # Ensure we have enough reference headers
-        if len(reference_headers) < len(bmp_files):
-            messagebox.showerror("Error", "Not enough headers in the reference TEX file for the number of BMP files.")
-            return
-
-        for idx, bmp_file in enumerate(bmp_files):
-            # Load the BMP image and ensure it's in palette mode to access indices and palette
-            image = Image.open(bmp_file).convert('P')
-            width, height = image.size
-            pixels = np.array(image)
-            
-            # Check format flag from the reference header
-            reference_header = reference_headers[idx]
-            format_flag_value = int.from_bytes(reference_header[0:4], 'little')
-            is_4bpp = format_flag_value == 0x14  # Assume 0x14 means 4bpp
-    
-            # Invert grayscale values for BMP to TEX format compatibility
-            pixels = 255 - pixels
-    
-            # Read the palette from the BMP image
-            palette = image.getpalette()  # This returns a list of RGB values
-    
-            # Determine the number of colors to extract based on 4bpp or 8bpp format
-            num_colors = 16 if is_4bpp else 256  # 16 colors for 4bpp, 256 for 8bpp
-            clut_data_raw = palette[:num_colors * 3]  # Extract colors for the CLUT
-            clut_data = []
-    
-            # Convert to RGBA, set alpha as 0x80 for non-zero entries as specified
-            for i in range(0, num_colors * 3, 3):
-                r, g, b = clut_data_raw[i], clut_data_raw[i + 1], clut_data_raw[i + 2]
-                alpha = 0x80 if (r, g, b) != (0, 0, 0) else 0x00  # Alpha as 0x80 if color isn't black
-                clut_data.append((r, g, b, alpha))
-    
-            # Flip the CLUT as specified
-            flipped_clut = clut_data[::-1]
-    
-            # Handle the twiddling and padding of CLUT based on format
-            if is_4bpp:
-                # For 4bpp, create two sections with a 32-byte gap in between
-                section1 = flipped_clut[:8]
-                section2 = flipped_clut[8:]
-                combined_clut = section1 + [(0x00, 0x00, 0x00, 0x00)] * 8 + section2  # Insert 32-byte gap
-    
-                # Pad the CLUT to 1024 bytes
-                padded_clut = combined_clut + [(0x00, 0x00, 0x00, 0x00)] * (256 - len(combined_clut))
-                bpp = 4
-            else:
-                # Use full 8bpp CLUT without additional padding
-                clut_entries = flipped_clut  # Already flipped, contains 256 entries
-                clut_twiddled = []
-                for i in range(0, 256, 32):
-                    clut_twiddled.extend(clut_entries[i:i+8])     # Colors 0-7
-                    clut_twiddled.extend(clut_entries[i+16:i+24]) # Colors 16-23
-                    clut_twiddled.extend(clut_entries[i+8:i+16])  # Colors 8-15
-                    clut_twiddled.extend(clut_entries[i+24:i+32]) # Colors 24-31
-                padded_clut = clut_twiddled  # Already 1024 bytes for 8bpp
-                bpp = 8
-    
-            # Convert indexed pixels to binary format based on bits per pixel
-            pixel_data = bytearray()
-            if bpp == 4:
-                # Pack two 4-bit indices per byte for 4bpp format
-                for y in range(height):
-                    for x in range(0, width, 2):
-                        low_nibble = pixels[y, x] & 0x0F
-                        high_nibble = (pixels[y, x + 1] & 0x0F) if (x + 1) < width else 0
-                        pixel_data.append((high_nibble << 4) | low_nibble)
-            else:  # 8bpp format
-                for y in range(height):
-                    for x in range(width):
-                        pixel_data.append(pixels[y, x])
-    
-            # Extract the unknown bytes from the reference header
-            unknown_bytes = reference_header[8:12]
-    
-            # Store all texture data for later processing
-            textures_data.append({
-                'format_flag_value': format_flag_value,
-                'width': width,
-                'height': height,
-                'bpp': bpp,
-                'pixel_data': pixel_data,
-                'clut_data': padded_clut,
-                'unknown_bytes': unknown_bytes
-            })
-    
-        # Start writing the new TEX file
-        with open(output_tex_file, 'wb') as out_file:
-            num_textures = len(textures_data)
-            out_file.write(num_textures.to_bytes(1, 'big'))
-            out_file.write(b'\x00' * 15)  # Fill the rest up to 0x10
-    
-            headers = []
-            data_offset = 0x10 + num_textures * 16  # Initial data offset after headers
-    
-            # First pass: Write headers and calculate offsets
-            for idx, tex in enumerate(textures_data):
-                format_flag_value = tex['format_flag_value']
-                width = tex['width']
-                height = tex['height']
-                bpp = tex['bpp']
-                pixel_data_size = (width * height) // (2 if bpp == 4 else 1)
-    
-                # Create texture header
-                header = bytearray(16)
-                header[0:4] = format_flag_value.to_bytes(4, 'little')
-                header[4:6] = width.to_bytes(2, 'little')
-                header[6:8] = height.to_bytes(2, 'little')
-                header[8:12] = tex['unknown_bytes']  # Include unknown bytes
-                header[12:16] = (data_offset - (0x10 + idx * 16)).to_bytes(4, 'little')  # Relative data offset
-    
-                headers.append(header)
-    
-                # Update data offset for next texture
-                data_offset += pixel_data_size + 1024  # Pixel data size + CLUT size
-    
-            # Second pass: Write headers
-            for header in headers:
-                out_file.write(header)
-    
-            # Third pass: Write pixel data and CLUTs
-            for tex in textures_data:
-                out_file.write(tex['pixel_data'])
-                for color in tex['clut_data']:
-                    out_file.write(bytes(color))
-    
-        print(f"\nTextures imported and saved to {output_tex_file}")
-        messagebox.showinfo("Import Complete", "Textures have been imported and saved successfully.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    run_task(runner, import_tex, (bmp_files, reference_tex_file, output_tex_file),
+             ("Import Complete", "Textures have been imported and saved successfully."))
+
+# Function to pick a folder and browse thumbnails of every TEX file in it
+def browse_textures(root):
+    from tkinter import filedialog
+    from texpreview import Gallery, ThumbnailCache
+
+    directory = filedialog.askdirectory(title="Select a folder of TEX files")
+    if not directory:
+        print("No folder selected.")
+        return
+
+    cache = ThumbnailCache()
+    Gallery(root, [path for path, found_in in collect_files([directory], '.tex')], cache, on_close=cache.close)
 
 # Main GUI setup
 def main():
+    import tkinter as tk
+    from tkinter import ttk
+
     root = tk.Tk()
     root.title("Haunting Ground TEX Importer/Exporter 1.0")
 
-    
-    root.geometry("300x150")
 
-    
-    btn_export = tk.Button(root, text="Export Textures", command=visualize_and_export_textures, width=25)
-    btn_import = tk.Button(root, text="Import Textures", command=import_textures, width=25)
+    root.geometry("300x260")
+
+
+    btn_export = tk.Button(root, text="Export Textures", width=25)
+    btn_import = tk.Button(root, text="Import Textures", width=25)
+    btn_browse = tk.Button(root, text="Browse Textures", command=lambda: browse_textures(root), width=25)
+    progress_bar = ttk.Progressbar(root, length=250, mode='determinate')
+    status_label = tk.Label(root, text="")
+    btn_cancel = tk.Button(root, text="Cancel", width=10, state='disabled')
+    runner = TaskRunner(root, progress_bar, status_label, [btn_export, btn_import], btn_cancel)
+    btn_export.config(command=lambda: visualize_and_export_textures(runner))
+    btn_import.config(command=lambda: import_textures(runner))
+    btn_cancel.config(command=runner.cancel)
+
+
+    btn_export.pack(pady=(20, 5))
+    btn_import.pack(pady=5)
+    btn_browse.pack(pady=5)
+    progress_bar.pack(pady=(10, 0))
+    status_label.pack()
+    btn_cancel.pack(pady=5)
 
-    
-    btn_export.pack(pady=20)
-    btn_import.pack(pady=10)
 
-    
     root.mainloop()
+    runner.shutdown()
 
-if __name__ == "__main__":
+# Expand files, glob patterns and directories (searched recursively) into
+# (path, root) pairs; root is the directory a path was found under, if any,
+# so batch output can mirror the input tree.
+def collect_files(patterns, extension):
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(extension):
+                        found.append((os.path.join(dirpath, filename), pattern))
+        elif glob.has_magic(pattern):
+            found.extend((path, None) for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+        else:
+            found.append((pattern, None))
+    return found
+
+# Output directory for a batch input, mirroring its place under its root
+def mirrored_dir(out_dir, path, root):
+    if root is None:
+        return out_dir
+    return os.path.join(out_dir, os.path.relpath(os.path.dirname(path), root))
+
+# Whether -o names an output directory rather than a single TEX file: it does
+# for several archives, for a directory among the inputs, and for an -o that
+# is already a directory or ends in a path separator
+def output_is_dir(args, archives):
+    separators = tuple(sep for sep in (os.sep, os.altsep) if sep)
+    return (archives != 1 or os.path.isdir(args.output) or args.output.endswith(separators)
+            or any(os.path.isdir(path) for path in args.inputs))
+
+def run_export(args):
+    from texbatch import export_batch
+
+    jobs = [(path, mirrored_dir(args.output, path, root)) for path, root in collect_files(args.inputs, '.tex')]
+    failed = 0
+    textures = [number - 1 for number in args.texture] if args.texture else None
+    if args.pack:
+        from texpack import export_pack
+        if os.path.dirname(args.pack):
+            os.makedirs(os.path.dirname(args.pack), exist_ok=True)
+        # Archives are named by their path under the directory they were found in
+        export_pack([(os.path.relpath(path, root).replace(os.sep, '/') if root else os.path.basename(path), path)
+                     for path, root in collect_files(args.inputs, '.tex')], args.pack)
+        texprof.log(0, f"Exported {len(jobs)} TEX files to {args.pack}")
+        return 0
+    if args.atlas:
+        from texatlas import export_atlases
+        results = export_atlases(jobs, args.workers)
+    else:
+        results = export_batch(jobs, args.workers, textures, args.cache,
+                               indexed=args.indexed, image_format=args.format)
+    for path, files, errors in results:
+        for error in errors:
+            print(f"Error exporting {path}: {error}", file=sys.stderr)
+        failed += bool(errors)
+    texprof.log(0, f"Exported {len(jobs) - failed} of {len(jobs)} TEX files")
+    return 1 if failed else 0
+
+def run_inspect(args):
+    from hgtex import inspect_tex
+
+    paths = [path for path, root in collect_files(args.inputs, '.tex')]
+    failed = 0
+    for path in paths:
+        try:
+            failed += bool(inspect_tex(path))
+        except OSError as e:
+            failed += 1
+            print(f"Error reading {path}: {e}", file=sys.stderr)
+    texprof.log(0, f"{len(paths) - failed} of {len(paths)} TEX files OK")
+    return 1 if failed else 0
+
+# Pair each original TEX file with its rebuilt counterpart: two files are
+# compared directly, two directories by matching relative paths.
+def run_verify(args):
+    from texverify import verify_tex
+
+    if os.path.isdir(args.original) and os.path.isdir(args.rebuilt):
+        pairs = [(path, os.path.join(args.rebuilt, os.path.relpath(path, args.original)))
+                 for path, root in collect_files([args.original], '.tex')]
+    else:
+        pairs = [(args.original, args.rebuilt)]
+    failed = 0
+    for original, rebuilt in pairs:
+        try:
+            failed += bool(verify_tex(original, rebuilt, args.decoded, args.tolerance))
+        except Exception as e:
+            failed += 1
+            print(f"Error verifying {rebuilt}: {e}", file=sys.stderr)
+    texprof.log(0, f"{len(pairs) - failed} of {len(pairs)} TEX files match")
+    return 1 if failed else 0
+
+def run_dedup(args):
+    from texdedup import export_deduplicated
+
+    jobs = [(path, mirrored_dir(args.output, path, root)) for path, root in collect_files(args.inputs, '.tex')]
+    manifest_path = args.manifest or os.path.join(args.output, 'manifest.json')
+    if os.path.dirname(manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    manifest, errors = export_deduplicated(jobs, manifest_path, args.workers, args.cache,
+                                           indexed=args.indexed, image_format=args.format)
+    for error in errors:
+        print(f"Error: {error}", file=sys.stderr)
+    texprof.log(0, f"Exported {manifest['unique']} unique of {manifest['textures']} textures "
+                   f"from {len(jobs)} TEX files")
+    return 1 if errors else 0
+
+def run_import(args):
+    from hgtex import TEXTURE_NAME, import_tex
+    from texcache import TexCache
+
+    # Files named on the command line are taken whatever their extension, except
+    # that .json files are atlas or texinfo files and .hgpack files are packs
+    bmp_files = [path for path, root in collect_files(args.inputs, ('.bmp', '.png'))
+                 if not path.lower().endswith(('.json', '.hgpack'))]
+    cache = TexCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+    # Packs and atlases carry their own headers and CLUTs
+    packs = [path for path, root in collect_files(args.inputs, '.hgpack') if path.lower().endswith('.hgpack')]
+    if packs:
+        return import_packs(args, packs)
+    atlases = [path for path, root in collect_files(args.inputs, '.atlas.json')
+               if path.lower().endswith('.atlas.json')]
+    if atlases:
+        return import_atlases(args, atlases)
+    if not args.reference:
+        return import_from_texinfo(args, bmp_files, cache)
+
+    # Images shared between archives are found through a dedup manifest
+    if args.manifest:
+        return import_from_manifest(args, cache)
+    if not bmp_files:
+        raise ValueError("No images given")
+
+    # A single reference TEX builds a single output file
+    if not os.path.isdir(args.reference):
+        import_tex(bmp_files, args.reference, args.output, cache, dither=args.dither)
+        return 0
+
+    # Otherwise group <stem>_textureN.bmp/.png files per archive and match each
+    # group with <stem>.tex from the reference tree
+    references = {}
+    for path, root in collect_files([args.reference], '.tex'):
+        references.setdefault(os.path.splitext(os.path.basename(path))[0].lower(), path)
+    groups = {}
+    for path in bmp_files:
+        match = TEXTURE_NAME.match(os.path.splitext(os.path.basename(path))[0])
+        if match:
+            groups.setdefault(match.group(1), []).append(path)
+
+    failed = 0
+    for stem, paths in sorted(groups.items()):
+        reference_tex_file = references.get(stem.lower())
+        try:
+            if reference_tex_file is None:
+                raise ValueError(f"No reference TEX file for {stem}")
+            os.makedirs(args.output, exist_ok=True)
+            output_tex_file = os.path.join(args.output, os.path.basename(reference_tex_file))
+            import_tex(paths, reference_tex_file, output_tex_file, cache, dither=args.dither)
+        except Exception as e:
+            failed += 1
+            print(f"Error importing {stem}: {e}", file=sys.stderr)
+    texprof.log(0, f"Imported {len(groups) - failed} of {len(groups)} TEX files")
+    return 1 if failed else 0
+
+def import_from_texinfo(args, bmp_files, cache):
+    from hgtex import find_texinfo, import_tex, texinfo_images
+
+    # Images of a single archive find their .texinfo.json themselves; a
+    # texinfo named without images finds the images next to it
+    texinfos = [(path, root) for path, root in collect_files(args.inputs, '.texinfo.json')
+                if path.lower().endswith('.texinfo.json')]
+    if not texinfos:
+        if not bmp_files:
+            raise ValueError("No images given")
+        texinfos = [(find_texinfo(bmp_files), None)]
+    if not output_is_dir(args, len(texinfos)):
+        import_tex(bmp_files or None, texinfos[0][0], args.output, cache, dither=args.dither)
+        return 0
+
+    # Archives go to <archive> in the output directory, mirroring the input tree
+    failed = 0
+    for texinfo_file, root in texinfos:
+        try:
+            texinfo, images = texinfo_images(texinfo_file, bmp_files or None)
+            output_tex_file = os.path.normpath(os.path.join(mirrored_dir(args.output, texinfo_file, root),
+                                                            texinfo['archive']))
+            os.makedirs(os.path.dirname(output_tex_file), exist_ok=True)
+            import_tex(images, texinfo_file, output_tex_file, cache, dither=args.dither)
+        except Exception as e:
+            failed += 1
+            print(f"Error importing {texinfo_file}: {e}", file=sys.stderr)
+    texprof.log(0, f"Imported {len(texinfos) - failed} of {len(texinfos)} TEX files")
+    return 1 if failed else 0
+
+def import_atlases(args, atlases):
+    from texatlas import import_atlas
+
+    if not output_is_dir(args, len(atlases)):
+        import_atlas(atlases[0], args.output)
+        return 0
+
+    # Atlases go to <archive> in the output directory
+    failed = 0
+    os.makedirs(args.output, exist_ok=True)
+    for manifest_file in atlases:
+        try:
+            with open(manifest_file) as manifest_input:
+                archive = json.load(manifest_input)['archive']
+            import_atlas(manifest_file, os.path.join(args.output, archive))
+        except Exception as e:
+            failed += 1
+            print(f"Error importing {manifest_file}: {e}", file=sys.stderr)
+    texprof.log(0, f"Imported {len(atlases) - failed} of {len(atlases)} TEX files")
+    return 1 if failed else 0
+
+# Rebuild every archive of the packs, as <archive name> in the output
+# directory; a pack of a single archive can also go straight to a TEX file
+def import_packs(args, packs):
+    from texpack import TexPack, import_pack
+
+    failed = 0
+    total = 0
+    for pack_path in packs:
+        with TexPack(pack_path) as pack:
+            if not output_is_dir(args, len(pack.names) if len(packs) == 1 else len(packs)):
+                import_pack(pack, pack.names[0], args.output)
+                return 0
+            for name in pack.names:
+                total += 1
+                try:
+                    output_tex_file = os.path.normpath(os.path.join(args.output, name))
+                    os.makedirs(os.path.dirname(output_tex_file), exist_ok=True)
+                    import_pack(pack, name, output_tex_file)
+                except Exception as e:
+                    failed += 1
+                    print(f"Error importing {name} from {pack_path}: {e}", file=sys.stderr)
+    texprof.log(0, f"Imported {total - failed} of {total} TEX files")
+    return 1 if failed else 0
+
+def import_from_manifest(args, cache):
+    from hgtex import import_tex
+    from texdedup import manifest_images
+
+    if not os.path.isdir(args.reference):
+        import_tex(manifest_images(args.manifest, args.reference), args.reference, args.output, cache,
+                   ordered=True, dither=args.dither)
+        return 0
+
+    failed = 0
+    references = [path for path, root in collect_files([args.reference], '.tex')]
+    for reference_tex_file in references:
+        try:
+            output_tex_file = os.path.normpath(os.path.join(mirrored_dir(args.output, reference_tex_file, args.reference),
+                                                            os.path.basename(reference_tex_file)))
+            os.makedirs(os.path.dirname(output_tex_file), exist_ok=True)
+            import_tex(manifest_images(args.manifest, reference_tex_file), reference_tex_file,
+                       output_tex_file, cache, ordered=True, dither=args.dither)
+        except Exception as e:
+            failed += 1
+            print(f"Error importing {reference_tex_file}: {e}", file=sys.stderr)
+    texprof.log(0, f"Imported {len(references) - failed} of {len(references)} TEX files")
+    return 1 if failed else 0
+
+def run_watch(args):
+    from texwatch import watch
+
+    watch(args.inputs, args.output, args.reference, args.interval, args.debounce, args.workers, args.cache,
+          args.dither)
+    return 0
+
+def run_gallery(args):
+    import tkinter as tk
+    from texpreview import Gallery, ThumbnailCache
+
+    root = tk.Tk()
+    root.withdraw()
+    with ThumbnailCache(args.cache) as cache:
+        Gallery(root, [path for path, found_in in collect_files(args.inputs, '.tex')], cache, args.size,
+                on_close=root.destroy)
+        root.mainloop()
+    return 0
+
+def run_patch(args):
+    import re
+    from hgtex import patch_tex
+
+    # Texture numbers come from the <stem>_textureN file names
+    images = {}
+    for path, root in collect_files(args.images, ('.bmp', '.png')):
+        match = re.search(r'_texture(\d+)$', os.path.splitext(os.path.basename(path))[0])
+        if not match:
+            raise ValueError(f"Can't tell which texture {path} is, expected a <name>_textureN file name")
+        images[int(match.group(1)) - 1] = path
+
+    tex_path = args.tex
+    if args.output:
+        shutil.copyfile(args.tex, args.output)
+        tex_path = args.output
+    patch_tex(tex_path, images, args.dither)
+    return 0
+
+# Run a command with the verbosity and profiling options shared by every command.
+# Stage timings are collected while --timings or --trace is given; --profile
+# covers this process only, so use -j 1 to see worker time in it too.
+def run_command(run, args):
+    texprof.verbosity = max(0, 2 - args.quiet)
+    if args.timings or args.trace:
+        texprof.timings = texprof.Timings()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if texprof.timings is not None:
+            if args.timings:
+                print(texprof.timings.summary())
+            if args.trace:
+                texprof.timings.write_trace(args.trace)
+            texprof.timings = None
+
+# Command-line entry point; without a command the GUI is launched
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Haunting Ground TEX Importer/Exporter")
+    commands = parser.add_subparsers(dest='command')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-q', '--quiet', action='count', default=0,
+                        help="Print less: -q for one line per file, -qq for errors and totals only")
+    common.add_argument('--timings', action='store_true', help="Print the time spent in each stage")
+    common.add_argument('--trace', metavar='PATH', help="Write the stage timings as a Chrome trace (JSON)")
+    common.add_argument('--profile', metavar='PATH', help="Write cProfile stats of this process")
+
+    export_parser = commands.add_parser('export', parents=[common], help="Export TEX files to BMP and CLUT files")
+    export_parser.add_argument('inputs', nargs='+', help="TEX files, glob patterns or directories")
+    export_parser.add_argument('-o', '--output', default='', help="Output directory (default: current directory)")
+    export_parser.add_argument('-j', '--workers', type=int, default=None,
+                               help="Worker processes (default: one per CPU core, 1 to run serially)")
+    export_parser.add_argument('-t', '--texture', type=int, action='append',
+                               help="Only export texture N (as numbered in the output names); can be repeated")
+    export_parser.add_argument('--indexed', action='store_true',
+                               help="Write the original indices and CLUT without requantizing (lossless)")
+    export_parser.add_argument('--format', choices=('bmp', 'png'), default='bmp', help="Image format (default: bmp)")
+    export_parser.add_argument('--atlas', action='store_true',
+                               help="Write one RGBA atlas PNG and a JSON layout per TEX file instead")
+    export_parser.add_argument('--pack', metavar='PATH',
+                               help="Write the index planes and CLUTs of all TEX files into one pack file instead")
+
+    import_parser = commands.add_parser('import', parents=[common], help="Build TEX files from BMP files")
+    import_parser.add_argument('inputs', nargs='*',
+                               help="BMP/PNG files, .atlas.json or .hgpack files, glob patterns or directories")
+    import_parser.add_argument('-r', '--reference',
+                               help="Reference TEX file, or a directory of them to import many archives at once "
+                                    "(default: the .texinfo.json files export wrote)")
+    import_parser.add_argument('-o', '--output', required=True,
+                               help="Output TEX file, or an output directory when --reference is a directory")
+    import_parser.add_argument('--manifest', metavar='PATH',
+                               help="Take each archive's images from a dedup manifest instead of the inputs")
+
+    watch_parser = commands.add_parser('watch', parents=[common],
+                                       help="Rebuild TEX files whenever their exported images change")
+    watch_parser.add_argument('inputs', nargs='+', help="Directories of exported images to watch")
+    watch_parser.add_argument('-o', '--output', required=True, help="Output directory for the rebuilt TEX files")
+    watch_parser.add_argument('-r', '--reference',
+                              help="Directory of reference TEX files (default: the .texinfo.json files)")
+    watch_parser.add_argument('-j', '--workers', type=int, default=None,
+                              help="Archives rebuilt at once (default: one per CPU core)")
+    watch_parser.add_argument('--interval', type=float, default=0.25,
+                              help="Seconds between directory scans (default: 0.25)")
+    watch_parser.add_argument('--debounce', type=float, default=0.3,
+                              help="Seconds an archive's files must be unchanged before it is rebuilt (default: 0.3)")
+
+    inspect_parser = commands.add_parser('inspect', parents=[common],
+                                         help="List and check the header tables of TEX files without exporting")
+    inspect_parser.add_argument('inputs', nargs='+', help="TEX files, glob patterns or directories")
+
+    verify_parser = commands.add_parser('verify', parents=[common],
+                                        help="Compare rebuilt TEX files with the originals texture by texture")
+    verify_parser.add_argument('original', help="Original TEX file, or a directory of them")
+    verify_parser.add_argument('rebuilt', help="Rebuilt TEX file, or a directory mirroring the originals")
+    verify_parser.add_argument('--decoded', action='store_true',
+                               help="Only compare decoded colors, so reordered CLUTs still match")
+    verify_parser.add_argument('--tolerance', type=int, default=0,
+                               help="Largest per-channel color difference accepted with --decoded (default: 0)")
+
+    dedup_parser = commands.add_parser('dedup', parents=[common],
+                                       help="Export the distinct textures of many TEX files once, with a manifest")
+    dedup_parser.add_argument('inputs', nargs='+', help="TEX files, glob patterns or directories")
+    dedup_parser.add_argument('-o', '--output', default='', help="Output directory (default: current directory)")
+    dedup_parser.add_argument('-m', '--manifest', help="Manifest path (default: <output>/manifest.json)")
+    dedup_parser.add_argument('-j', '--workers', type=int, default=None,
+                              help="Worker processes (default: one per CPU core, 1 to run serially)")
+    dedup_parser.add_argument('--indexed', action='store_true',
+                              help="Write the original indices and CLUT without requantizing (lossless)")
+    dedup_parser.add_argument('--format', choices=('bmp', 'png'), default='bmp', help="Image format (default: bmp)")
+
+    patch_parser = commands.add_parser('patch', parents=[common], help="Replace some textures of a TEX file in place")
+    patch_parser.add_argument('tex', help="TEX file to patch")
+    patch_parser.add_argument('images', nargs='+', help="<name>_textureN BMP/PNG files, glob patterns or directories")
+    patch_parser.add_argument('-o', '--output', help="Patch a copy written here instead of the TEX file itself")
+
+    for command_parser in (export_parser, import_parser, dedup_parser, watch_parser):
+        command_parser.add_argument('--cache', metavar='DIR',
+                                    help="Cache directory; unchanged textures are skipped or reused")
+    import_parser.add_argument('--cache-size', type=int, default=512, metavar='MB',
+                               help="Cache size limit, least recently used entries go first (default: 512)")
+    for command_parser in (import_parser, patch_parser, watch_parser):
+        command_parser.add_argument('--dither', action='store_true',
+                                    help="Ordered dithering when true-color images are mapped onto a CLUT")
+
+    gallery_parser = commands.add_parser('gallery', help="Browse thumbnails of every texture in TEX files")
+    gallery_parser.add_argument('inputs', nargs='+', help="TEX files, glob patterns or directories")
+    gallery_parser.add_argument('--size', type=int, default=96, help="Thumbnail size in pixels (default: 96)")
+    gallery_parser.add_argument('--cache', metavar='DIR', help="Thumbnail cache directory (default: ~/.cache/hgtex)")
+
+    commands.add_parser('gui', help="Launch the GUI (the default)")
+
+    args = parser.parse_args(argv)
+    if args.command in ('export', 'dedup'):
+        try:
+            return run_command(run_export if args.command == 'export' else run_dedup, args)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    if args.command in ('import', 'patch', 'inspect', 'verify', 'watch'):
+        try:
+            return run_command({'import': run_import, 'patch': run_patch, 'inspect': run_inspect,
+                                'verify': run_verify, 'watch': run_watch}[args.command], args)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    if args.command == 'gallery':
+        return run_gallery(args)
     main()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,437 @@
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+from bmpio import IndexedBmpWriter
+from clut import export_clut, import_clut
+from texcache import content_key
+from texcodec import clut_to_array, decode_texture, pack_indices
+from texfile import CLUT_SIZE, TexFile, TexWriter, check_index, format_bpp, read_index
+import texprof
+from texprof import log, stage
+from texremap import quantize_palette, remap
+
+TEXINFO_VERSION = 1
+BAND_PIXELS = 1 << 20  # Pixels per band when writing BMPs a band at a time
+
+# <stem>_textureN, the name export gives the image of texture N
+TEXTURE_NAME = re.compile(r'(.+)_texture(\d+)$', re.IGNORECASE)
+
+
+# Export texture idx (0-based) of an open TexFile as <stem>_texture<idx+1>.bmp
+# (or .png) plus its processed CLUT. By default the decoded colors are
+# requantized to an adaptive palette; indexed=True writes the original indices
+# and CLUT instead (4-bit images for 0x14 textures, 8-bit for 0x13). With a
+# TexCache, textures that haven't changed since their last export are skipped.
+# Returns the list of files written.
+def export_texture(tex, stem, idx, out_dir='', indexed=False, image_format='bmp', cache=None):
+    from PIL import Image  # Only loaded by the commands that read or write images
+
+    exported_files = []
+    where = {'file': tex.path, 'texture': idx + 1}
+
+    # Extract properties
+    format_flag_value = int(tex.index['format'][idx])
+    width, height = tex.size(idx)
+    log(2, f"\nTexture {idx + 1} dimensions: {width}x{height}")
+    log(2, f"Format flag value: {format_flag_value}")
+
+    # Bits per pixel based on the format flag
+    bpp = format_bpp(format_flag_value)
+    log(2, f"Bits per pixel for texture {idx + 1}: {bpp}")
+
+    # Calculate pixel data size based on bpp
+    pixel_data_size = tex.pixel_data_size(idx)
+    log(2, f"Pixel data size for texture {idx + 1}: {pixel_data_size} bytes")
+
+    # Pixel data and the CLUT after it are views into the mapped file
+    pixel_data = tex.pixel_data(idx)
+    log(2, f"CLUT for texture {idx + 1} starts at: {hex(int(tex.index['offset'][idx]) + pixel_data_size)}, "
+           f"size: {CLUT_SIZE} bytes")
+
+    clut_output_file = os.path.join(out_dir, f"{stem}_texture{idx + 1}_clut.bin")
+    image_output_file = os.path.join(out_dir, f"{stem}_texture{idx + 1}.{image_format}")
+
+    # Skip textures whose content and outputs are unchanged since the last run
+    if cache is not None:
+        with stage('read', **where):
+            key = content_key(bytes(tex.header(idx)[:12]), pixel_data, tex.clut_data(idx),
+                              f"{indexed}:{image_format}".encode())
+        if cache.export_is_current(key, [clut_output_file, image_output_file]):
+            log(2, f"Texture {idx + 1} is unchanged, skipped")
+            return [clut_output_file, image_output_file]
+
+    # Unswizzle the CLUT into color order and scale alpha
+    with stage('clut', **where):
+        clut_data = export_clut(tex.clut(idx))
+
+    # Export the processed CLUT data
+    with stage('write', **where):
+        with open(clut_output_file, 'wb') as clut_file:
+            clut_file.write(clut_data.tobytes())
+    exported_files.append(clut_output_file)
+    log(2, f"Exported processed CLUT for texture {idx + 1} as {clut_output_file}")
+
+    if indexed:
+        # Write the TEX indices and CLUT as they are, without requantizing.
+        # Image index i holds TEX index num_colors - 1 - i and the palette is
+        # flipped to match, which is exactly what import_tex undoes.
+        num_colors = 1 << bpp
+        palette = clut_to_array(clut_data)[:num_colors, :3][::-1]
+        if image_format == 'bmp':
+            # BMP is written a band of rows at a time, straight from the mapped
+            # file, so memory stays bounded whatever the texture size
+            band_rows = max(1, BAND_PIXELS // max(width, 1))
+            with IndexedBmpWriter(image_output_file, width, height, palette, bpp) as bmp:
+                for first_row in range(0, height, band_rows):
+                    with stage('decode', **where):
+                        indices, mask = tex.index_rows(idx, first_row, min(first_row + band_rows, height))
+                    with stage('encode', **where):
+                        bmp.write_rows(first_row, (num_colors - 1) - indices)
+        else:
+            with stage('decode', **where):
+                indices, mask = tex.indices(idx)
+                indices = (num_colors - 1) - indices
+
+            with stage('encode', **where):
+                image = Image.fromarray(indices)
+                image.putpalette(palette.tobytes())
+                image.save(image_output_file, **({'bits': 4} if bpp == 4 else {}))
+    else:
+        # Map the pixel data through the twiddled CLUT in one lookup, straight
+        # to RGB since the adaptive palette ignores alpha. Requantizing needs
+        # the whole image, so this path can't go by bands.
+        with stage('decode', **where):
+            rgb_clut = np.ascontiguousarray(clut_to_array(clut_data)[:, :3])
+            rgb_pixels = decode_texture(pixel_data, width, height, bpp, rgb_clut)
+
+        # Create an image file with indexed colors
+        with stage('encode', **where):
+            image = Image.fromarray(rgb_pixels, 'RGB')
+            del rgb_pixels
+            image = image.convert('P', palette=Image.ADAPTIVE, colors=256)  # Convert to indexed BMP
+            image.save(image_output_file)
+    exported_files.append(image_output_file)
+    log(2, f"Exported texture {idx + 1} as {image_output_file}")
+
+    if cache is not None:
+        cache.record_export(key, exported_files)
+    return exported_files
+
+
+# Sort key putting images in texture order: N for a <stem>_textureN name, so
+# digits in the stem (em01_texture10) don't count, otherwise the first number
+# in the name as import has always done
+def texture_number(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    match = TEXTURE_NAME.match(stem)
+    if match:
+        return int(match.group(2))
+    match = re.search(r'\d+', stem)
+    return int(match.group()) if match else 0
+
+
+# Write <stem>.texinfo.json for an open TexFile: per texture the format flag,
+# unknown header bytes, dimensions and the name its image is exported under,
+# which is all import needs besides the images. Only the header table is read,
+# so exporting a single texture still leaves the rest of the archive alone.
+# Returns the path written.
+def write_texinfo(tex, stem, out_dir=''):
+    texinfo_file = os.path.join(out_dir, f"{stem}.texinfo.json")
+    textures = []
+    for idx in range(len(tex)):
+        format_flag_value, width, height, unknown, offset = tex.index[idx].tolist()
+        textures.append({
+            'texture': idx + 1,
+            'name': f"{stem}_texture{idx + 1}",
+            'format': format_flag_value,
+            'unknown': bytes(unknown).hex(),
+            'width': width,
+            'height': height,
+        })
+    with stage('write', tex.path), open(texinfo_file, 'w') as texinfo_output:
+        json.dump({'version': TEXINFO_VERSION, 'archive': os.path.basename(tex.path), 'textures': textures},
+                  texinfo_output, separators=(',', ':'))
+    return texinfo_file
+
+
+# Images for the textures listed in a texinfo file, in texture order. Each is
+# looked up by its exported name among image_files, or next to the texinfo
+# file when image_files is None, so the order never depends on sorting names.
+def texinfo_images(texinfo_file, image_files=None):
+    with open(texinfo_file) as texinfo_input:
+        texinfo = json.load(texinfo_input)
+    if image_files is None:
+        directory = os.path.dirname(texinfo_file)
+        image_files = [os.path.join(directory, name) for name in sorted(os.listdir(directory or '.'))
+                       if name.lower().endswith(('.bmp', '.png'))]
+    by_name = {os.path.splitext(os.path.basename(path))[0]: path for path in image_files}
+
+    missing = [texture['name'] for texture in texinfo['textures'] if texture['name'] not in by_name]
+    if missing:
+        raise ValueError(f"No image for {', '.join(missing)} ({texinfo_file})")
+    return texinfo, [by_name[texture['name']] for texture in texinfo['textures']]
+
+
+# The texinfo file describing the given images: <stem>.texinfo.json in the
+# directory of the first image that lists it
+def find_texinfo(image_files):
+    names = {os.path.splitext(os.path.basename(path))[0] for path in image_files}
+    for directory in dict.fromkeys(os.path.dirname(path) for path in image_files):
+        for texinfo_file in sorted(glob.glob(os.path.join(glob.escape(directory), '*.texinfo.json'))):
+            with open(texinfo_file) as texinfo_input:
+                listed = {texture['name'] for texture in json.load(texinfo_input)['textures']}
+            if names <= listed:
+                return texinfo_file
+    raise ValueError("No reference TEX file given and no .texinfo.json found for the images")
+
+
+# The 0-based texture indices to export from an archive of num_textures,
+# all of them if textures is None; numbers outside the archive are an error
+def select_textures(file_path, num_textures, textures=None):
+    if textures is None:
+        return range(num_textures)
+    missing = [idx + 1 for idx in textures if not 0 <= idx < num_textures]
+    if missing:
+        raise ValueError(f"{file_path} has no texture {', '.join(map(str, missing))} "
+                         f"(textures are numbered 1 to {num_textures})")
+    return list(textures)
+
+
+# Export every texture of a TEX file as <stem>_textureN.bmp plus its processed
+# CLUT as <stem>_textureN_clut.bin in out_dir (the current directory by default),
+# and the header sidecar <stem>.texinfo.json.
+# textures optionally limits the export to some 0-based texture indices; only
+# those textures are read. indexed, image_format and cache are passed on to
+# export_texture. progress, if given, is called with (done, total) after every
+# texture; an exception raised from it stops the export. Returns the list of
+# files written.
+def export_tex(file_path, out_dir=None, textures=None, indexed=False, image_format='bmp', cache=None,
+               progress=None):
+    out_dir = out_dir or ''
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    exported_files = []
+
+    with stage('parse', file_path):
+        tex = TexFile(file_path)
+    with tex:
+        log(2, f"Number of textures: {len(tex)}")
+        for idx in range(len(tex) if texprof.verbosity >= 2 else 0):
+            log(2, f"Header {idx + 1}: {bytes(tex.header(idx)).hex()}")
+            log(2, f"Data offset for texture {idx + 1}: {hex(int(tex.index['offset'][idx]))}")
+        selected = select_textures(file_path, len(tex), textures)
+        exported_files.append(write_texinfo(tex, stem, out_dir))
+
+        for done, idx in enumerate(selected, 1):
+            exported_files += export_texture(tex, stem, idx, out_dir, indexed, image_format, cache)
+            if progress is not None:
+                progress(done, len(selected))
+
+    log(1, f"Exported {len(selected)} textures from {file_path}")
+    return exported_files
+
+
+# Print the header table of a TEX file (index, format, size, bpp, data offset
+# and block size) after checking it against the file length. Only the header
+# bytes are read. Returns the list of problems found, empty if the whole file
+# can be exported.
+def inspect_tex(file_path):
+    with stage('parse', file_path):
+        index, declared, file_size = read_index(file_path)
+        problems = check_index(index, declared, file_size)
+
+    if texprof.verbosity >= 2:
+        log(2, f"{file_path}: {len(index)} textures, {file_size} bytes")
+        log(2, "  #  Format   Size        Bpp  Offset      Bytes")
+        for idx, (format_flag_value, width, height, unknown, offset) in enumerate(index.tolist()):
+            bpp = {0x13: 8, 0x14: 4}.get(format_flag_value)
+            size = (width * height) // (2 if bpp == 4 else 1) + CLUT_SIZE
+            log(2, f"{idx + 1:>3}  {hex(format_flag_value):<7}  {f'{width}x{height}':<10}  {bpp or '?':>3}  "
+                   f"{hex(offset):<10}  {size}")
+    for problem in problems:
+        log(0, f"{file_path}: {problem}")
+    status = f"{len(problems)} problem{'s' if len(problems) > 1 else ''}" if problems else 'OK'
+    log(1, f"{file_path}: {len(index)} textures, {status}")
+    return problems
+
+
+# The <stem>_clut.bin export wrote next to an image, or None
+def clut_sidecar(image_file):
+    try:
+        with open(os.path.splitext(image_file)[0] + '_clut.bin', 'rb') as sidecar_file:
+            return sidecar_file.read()
+    except FileNotFoundError:
+        return None
+
+
+# Convert an edited image to TEX (height, width) indices and a (256, 4) CLUT.
+# sidecar is the texture's exported _clut.bin, if any, see import_clut; out is
+# an optional (256, 4) array to build the CLUT in. True-color images, and
+# palette images using more colors than the texture can hold, are remapped
+# onto the sidecar's colors (or a new palette without one), see texremap.
+def convert_image(image_file, is_4bpp, sidecar=None, out=None, dither=False):
+    from PIL import Image
+
+    num_colors = 16 if is_4bpp else 256
+
+    # Load the BMP image and ensure it's in palette mode to access indices and palette
+    with stage('read', image_file):
+        image = Image.open(image_file)
+        if image.mode == 'P' and np.array(image).max(initial=0) >= num_colors:
+            image = image.convert('RGB')
+        if image.mode in ('RGB', 'RGBA'):
+            return remap_image(image_file, image, num_colors, sidecar, out, dither)
+        image = image.convert('P')
+        pixels = np.array(image)
+
+        # Invert grayscale values for BMP to TEX format compatibility
+        pixels = 255 - pixels
+
+    # Build the TEX CLUT from the BMP palette: 16 colors for 4bpp, 256 for 8bpp
+    with stage('clut', image_file):
+        palette = image.getpalette()  # This returns a list of RGB values
+        clut_data = import_clut(palette, num_colors, sidecar, out)
+    return pixels, clut_data
+
+
+# convert_image for true-color images: every pixel is mapped to the nearest
+# color of the texture's exported CLUT, or of a new num_colors palette when
+# there is no sidecar, so 4bpp textures never get more than 16 colors
+def remap_image(image_file, image, num_colors, sidecar, out, dither):
+    with stage('remap', image_file):
+        if sidecar is not None:
+            colors = np.frombuffer(sidecar, dtype=np.uint8, count=len(sidecar) // 4 * 4).reshape(-1, 4)
+            palette = np.zeros((num_colors, 3), dtype=np.uint8)
+            palette[:min(len(colors), num_colors)] = colors[:num_colors, :3]
+        else:
+            palette = quantize_palette(image, num_colors)
+        pixels = remap(np.asarray(image.convert('RGB')), palette, dither)
+
+    # import_clut expects the flipped image palette order
+    with stage('clut', image_file):
+        clut_data = import_clut(palette[::-1].reshape(-1), num_colors, sidecar, out)
+    return pixels, clut_data
+
+
+# Build a TEX file from BMP files, taking the format flags and unknown header
+# bytes from a reference TEX file; bmp_files are put in order by the numbers in
+# their names unless ordered is set. Without a reference (or given a
+# .texinfo.json instead), headers and order come from the texinfo file export
+# wrote, and every texture it lists needs an image. With a TexCache, images
+# converted in an earlier run have their packed pixels and CLUT reused.
+# progress works as for export_tex; if it raises, the partial output file is
+# removed. Images with the _clut.bin export wrote next to them get their alpha,
+# and the padding of 16-color CLUTs, back from it instead of the black =
+# transparent rule. dither applies to true-color images, see convert_image.
+def import_tex(bmp_files, reference_tex_file, output_tex_file, cache=None, ordered=False, progress=None,
+               dither=False):
+    from PIL import Image
+
+    if reference_tex_file is None or reference_tex_file.lower().endswith('.texinfo.json'):
+        # Headers rebuilt from the texinfo sidecar; offsets are recomputed anyway
+        texinfo, bmp_files = texinfo_images(reference_tex_file or find_texinfo(bmp_files), bmp_files)
+        reference_headers = [texture['format'].to_bytes(4, 'little') + bytes(4) +
+                             bytes.fromhex(texture['unknown']) + bytes(4) for texture in texinfo['textures']]
+    else:
+        if not ordered:
+            bmp_files = sorted(bmp_files, key=texture_number)
+
+        # Read the headers and unknown bytes from the reference TEX file
+        with stage('parse', reference_tex_file):
+            with TexFile(reference_tex_file) as ref_file:
+                reference_headers = [bytes(ref_file.header(i)) for i in range(len(ref_file))]
+
+    # Ensure we have enough reference headers
+    if len(reference_headers) < len(bmp_files):
+        raise ValueError("Not enough headers in the reference TEX file for the number of BMP files.")
+
+    # The header table only needs the BMP dimensions (opening an image reads
+    # just its header) and the reference format flags and unknown bytes
+    layout = []
+    for idx, bmp_file in enumerate(bmp_files):
+        with Image.open(bmp_file) as image:
+            width, height = image.size
+        format_flag_value = int.from_bytes(reference_headers[idx][0:4], 'little')
+        layout.append((format_flag_value, width, height, reference_headers[idx][8:12]))
+
+    # Convert and stream out one texture at a time
+    clut_buffer = np.empty((256, 4), dtype=np.uint8)
+    with TexWriter(output_tex_file, layout) as writer:
+        for idx, bmp_file in enumerate(bmp_files):
+            is_4bpp = layout[idx][0] == 0x14  # Assume 0x14 means 4bpp
+
+            # An image converted before only needs its packed block spliced in
+            block = None
+            sidecar = clut_sidecar(bmp_file)
+            if cache is not None:
+                with open(bmp_file, 'rb') as image_file:
+                    key = content_key(image_file.read(), reference_headers[idx][0:4], sidecar or b'',
+                                      b'dither' if dither else b'')
+                block = cache.get(key)
+                if block is not None:
+                    writer.write_packed(block)
+                    log(2, f"Texture {idx + 1} is unchanged, reused the cached data")
+
+            if block is None:
+                pixels, clut_data = convert_image(bmp_file, is_4bpp, sidecar, clut_buffer, dither)
+                block = writer.write_texture(pixels, clut_data)
+                if cache is not None:
+                    cache.put(key, block)
+            if progress is not None:
+                progress(idx + 1, len(bmp_files))
+
+    log(1, f"\nTextures imported and saved to {output_tex_file}")
+
+
+# Replace some textures of an existing TEX file in place. images maps 0-based
+# texture indices to image files. A texture whose new pixels and CLUT fit in
+# its old slot is overwritten with a single seek and write; a bigger one is
+# appended at the end of the file. Only the header of a texture whose size or
+# offset changed is rewritten, the rest of the archive is left untouched.
+# dither is passed on to convert_image.
+def patch_tex(tex_path, images, dither=False):
+    with TexFile(tex_path) as tex:
+        num_textures = len(tex)
+        index = tex.index.copy()
+        end_of_file = len(tex.data)
+
+    patches = []
+    for idx, image_file in sorted(images.items()):
+        if not 0 <= idx < num_textures:
+            raise ValueError(f"{tex_path} has no texture {idx + 1}")
+        format_flag_value = int(index['format'][idx])
+        bpp = 4 if format_flag_value == 0x14 else 8  # Assume 0x14 means 4bpp
+        old_width, old_height = int(index['width'][idx]), int(index['height'][idx])
+        old_size = (old_width * old_height) // (2 if bpp == 4 else 1) + CLUT_SIZE
+
+        pixels, clut_data = convert_image(image_file, bpp == 4, clut_sidecar(image_file), dither=dither)
+        height, width = pixels.shape
+        with stage('pack', tex_path, idx + 1):
+            block = pack_indices(pixels, bpp) + clut_data.tobytes()
+        # The CLUT must land where readers expect it, right after (width * height) // 2
+        # bytes; odd-width 4bpp rows are padded, so those always move
+        fits = len(block) == (width * height) // (2 if bpp == 4 else 1) + CLUT_SIZE and len(block) <= old_size
+
+        offset = int(index['offset'][idx])
+        if not fits:
+            offset = end_of_file
+            end_of_file += len(block)
+        patches.append((idx, offset, width, height, block, fits and (width, height) == (old_width, old_height)))
+
+    with stage('write', tex_path), open(tex_path, 'r+b') as tex_file:
+        for idx, offset, width, height, block, same_header in patches:
+            tex_file.seek(offset)
+            tex_file.write(block)
+            if not same_header:
+                header_offset = 0x10 + idx * 16
+                tex_file.seek(header_offset + 4)
+                tex_file.write(width.to_bytes(2, 'little') + height.to_bytes(2, 'little'))
+                tex_file.seek(header_offset + 12)
+                tex_file.write((offset - header_offset).to_bytes(4, 'little'))
+            log(2, f"Patched texture {idx + 1} at {hex(offset)}{'' if same_header else ' (header updated)'}")
+    log(1, f"Patched {len(patches)} textures of {tex_path}")
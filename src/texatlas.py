@@ -0,0 +1,174 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import texprof
+from clut import export_clut
+from texbatch import check_targets, merge_timings
+from texcodec import clut_to_array
+from texfile import CLUT_SIZE, TexFile, TexWriter, format_bpp
+from texprof import log, stage
+
+ATLAS_VERSION = 1
+
+
+# Shelf-pack (width, height) sizes into rows of an atlas about as wide as it is
+# tall: tallest first, left to right, starting a new row when one is full.
+# Returns the (x, y) of every size in input order and the atlas size.
+def pack_layout(sizes):
+    area = sum(width * height for width, height in sizes)
+    atlas_width = max([math.ceil(math.sqrt(area))] + [width for width, height in sizes] + [1])
+    positions = [None] * len(sizes)
+    x = y = row_height = 0
+    for idx in sorted(range(len(sizes)), key=lambda idx: -sizes[idx][1]):
+        width, height = sizes[idx]
+        if x + width > atlas_width:
+            x, y = 0, y + row_height
+            row_height = 0
+        positions[idx] = (x, y)
+        x += width
+        row_height = max(row_height, height)
+    return positions, (atlas_width, max(1, y + row_height))
+
+
+# Export every texture of a TEX file into a single RGBA atlas <stem>.atlas.png
+# plus <stem>.atlas.json, which holds the layout, the raw headers and the raw
+# CLUTs, so two files replace the two per texture a normal export writes.
+# Returns the list of files written.
+def export_atlas(file_path, out_dir=None):
+    out_dir = out_dir or ''
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    atlas_file = os.path.join(out_dir, f"{stem}.atlas.png")
+    manifest_file = os.path.join(out_dir, f"{stem}.atlas.json")
+
+    with stage('parse', file_path):
+        tex = TexFile(file_path)
+    with tex:
+        sizes = [tex.size(idx) for idx in range(len(tex))]
+        positions, (atlas_width, atlas_height) = pack_layout(sizes)
+        atlas = np.zeros((atlas_height, atlas_width, 4), dtype=np.uint8)
+        textures = []
+        for idx, ((width, height), (x, y)) in enumerate(zip(sizes, positions)):
+            tex.bpp(idx)  # Unsupported formats fail here, before anything is written
+            with stage('clut', file_path, idx + 1):
+                clut = clut_to_array(export_clut(tex.clut(idx)))
+            with stage('decode', file_path, idx + 1):
+                atlas[y:y + height, x:x + width] = tex.decode(idx, clut)
+            textures.append({
+                'texture': idx + 1,
+                'x': x,
+                'y': y,
+                'width': width,
+                'height': height,
+                'header': bytes(tex.header(idx)).hex(),
+                'clut': bytes(tex.clut_data(idx)).hex(),
+            })
+
+    with stage('encode', file_path):
+        Image.fromarray(atlas, 'RGBA').save(atlas_file)
+    manifest = {
+        'version': ATLAS_VERSION,
+        'archive': os.path.basename(file_path),
+        'atlas': os.path.basename(atlas_file),
+        'width': atlas_width,
+        'height': atlas_height,
+        'textures': textures,
+    }
+    with stage('write', file_path), open(manifest_file, 'w') as manifest_output:
+        json.dump(manifest, manifest_output, separators=(',', ':'))
+    log(1, f"Exported {len(textures)} textures from {file_path} as {atlas_file}")
+    return [atlas_file, manifest_file]
+
+
+# RGBA colors -> 32-bit keys
+def rgba_keys(rgba):
+    return np.ascontiguousarray(rgba, dtype=np.uint8).view('<u4')[..., 0]
+
+
+# Map (height, width, 4) RGBA pixels back to CLUT indices. A color that is in
+# the CLUT gets its lowest index, so unedited textures decode to the same
+# colors again; any other color gets the nearest CLUT entry.
+def match_colors(pixels, colors):
+    color_keys = rgba_keys(colors)
+    unique_keys, first_index = np.unique(color_keys, return_index=True)
+    pixel_keys = rgba_keys(pixels)
+    positions = np.minimum(np.searchsorted(unique_keys, pixel_keys), len(unique_keys) - 1)
+    found = unique_keys[positions] == pixel_keys
+    indices = first_index[positions].astype(np.uint8)
+
+    if not found.all():
+        # Only the distinct unmatched colors are compared against the CLUT
+        missing_keys, inverse = np.unique(pixel_keys[~found], return_inverse=True)
+        missing = missing_keys.astype('<u4').view(np.uint8).reshape(-1, 4).astype(np.int32)
+        distances = ((missing[:, None, :] - colors[None, :, :].astype(np.int32)) ** 2).sum(axis=2)
+        indices[~found] = distances.argmin(axis=1).astype(np.uint8)[inverse.reshape(-1)]
+    return indices
+
+
+# Build a TEX file from an atlas written by export_atlas. Headers and CLUTs
+# come from the manifest, so no reference file is needed; only the pixels are
+# read from the atlas image.
+def import_atlas(manifest_file, output_tex_file):
+    with open(manifest_file) as manifest_input:
+        manifest = json.load(manifest_input)
+    atlas_file = os.path.join(os.path.dirname(manifest_file), manifest['atlas'])
+    with stage('read', atlas_file):
+        atlas = np.array(Image.open(atlas_file).convert('RGBA'))
+
+    layout = []
+    for texture in manifest['textures']:
+        header = bytes.fromhex(texture['header'])
+        format_flag_value = int.from_bytes(header[0:4], 'little')
+        layout.append((format_flag_value, texture['width'], texture['height'], header[8:12]))
+
+    with TexWriter(output_tex_file, layout) as writer:
+        for texture, (format_flag_value, width, height, unknown_bytes) in zip(manifest['textures'], layout):
+            clut_data = bytes.fromhex(texture['clut'])
+            if len(clut_data) != CLUT_SIZE:
+                raise ValueError(f"Texture {texture['texture']} has a truncated CLUT in {manifest_file}")
+            with stage('clut', atlas_file, texture['texture']):
+                colors = clut_to_array(export_clut(np.frombuffer(clut_data, dtype=np.uint8)))
+            x, y = texture['x'], texture['y']
+            with stage('decode', atlas_file, texture['texture']):
+                pixels = atlas[y:y + height, x:x + width]
+                if pixels.shape[:2] != (height, width):
+                    raise ValueError(f"Texture {texture['texture']} lies outside {atlas_file}")
+                indices = match_colors(pixels, colors[:1 << format_bpp(format_flag_value)])
+            writer.write_texture(indices, clut_data)
+
+    log(1, f"Textures imported from {atlas_file} and saved to {output_tex_file}")
+
+
+# Worker task for export_atlases, returning (files, error, timing records)
+def export_atlas_task(task):
+    file_path, out_dir, (verbosity, profiling) = task
+    texprof.verbosity = verbosity
+    parent_timings = texprof.timings
+    texprof.timings = texprof.Timings() if profiling else None
+    try:
+        return export_atlas(file_path, out_dir), None, texprof.timings and texprof.timings.records
+    except Exception as e:
+        return [], str(e), texprof.timings and texprof.timings.records
+    finally:
+        texprof.timings = parent_timings
+
+
+# Atlas export of many TEX files, one process per file. jobs are
+# (tex_path, out_dir) pairs as for export_batch; returns (tex_path, files, errors).
+def export_atlases(jobs, workers=None):
+    check_targets(jobs)
+    workers = workers or os.cpu_count() or 1
+    settings = (texprof.verbosity, texprof.timings is not None)
+    tasks = [(file_path, out_dir, settings) for file_path, out_dir in jobs]
+    if workers == 1:
+        outcomes = [merge_timings(outcome) for outcome in map(export_atlas_task, tasks)]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            outcomes = [merge_timings(outcome) for outcome in pool.map(export_atlas_task, tasks)]
+    return [(file_path, files, [error] if error else []) for (file_path, out_dir), (files, error) in zip(jobs, outcomes)]
@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from hgtex import export_texture, select_textures, write_texinfo
+import texprof
+from texcache import TexCache
+from texfile import TexFile
+from texprof import stage
+
+# Cache connections of this process, one per cache directory
+open_caches = {}
+
+
+# Worker task: export a single texture of a TEX file. Returns the files written,
+# the error message, if any, so one bad texture doesn't stop the batch, and the
+# stage timings recorded while profiling (worker processes don't share the
+# parent's texprof state, so verbosity and profiling travel with the task).
+def export_texture_task(task):
+    file_path, idx, out_dir, cache_dir, options, (verbosity, profiling) = task
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    texprof.verbosity = verbosity
+    parent_timings = texprof.timings
+    texprof.timings = texprof.Timings() if profiling else None
+    try:
+        if cache_dir and cache_dir not in open_caches:
+            open_caches[cache_dir] = TexCache(cache_dir)
+        with stage('parse', file_path, idx + 1):
+            tex = TexFile(file_path)
+        with tex:
+            files = export_texture(tex, stem, idx, out_dir, cache=open_caches.get(cache_dir), **options)
+        return files, None, texprof.timings and texprof.timings.records
+    except Exception as e:
+        return [], f"texture {idx + 1}: {e}", texprof.timings and texprof.timings.records
+    finally:
+        texprof.timings = parent_timings
+
+
+# Export many TEX files across a process pool. jobs is a list of
+# (tex_path, out_dir) pairs; each file is split into one task per texture
+# after its texinfo sidecar is written.
+# Results come back in job order as (tex_path, files, errors), whatever the
+# number of workers, and a worker count of 1 runs everything in-process.
+# textures optionally limits every file to some 0-based texture indices;
+# cache_dir enables a TexCache there and options are passed on to export_texture.
+# Stage timings of the workers are merged into texprof.timings when it is set.
+def export_batch(jobs, workers=None, textures=None, cache_dir=None, **options):
+    check_targets(jobs)
+
+    # Opening a TexFile only parses its header table, so the work is split up here
+    settings = (texprof.verbosity, texprof.timings is not None)
+    tasks = []
+    results = []
+    for file_path, out_dir in jobs:
+        try:
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            with stage('parse', file_path), TexFile(file_path) as tex:
+                selected = select_textures(file_path, len(tex), textures)
+                texinfo_file = write_texinfo(tex, os.path.splitext(os.path.basename(file_path))[0], out_dir)
+        except Exception as e:
+            results.append((file_path, 0, str(e), None))
+            continue
+        tasks.extend((file_path, idx, out_dir, cache_dir, options, settings) for idx in selected)
+        results.append((file_path, len(selected), None, texinfo_file))
+
+    return collect_results(results, run_tasks(tasks, workers))
+
+
+# Two archives with the same name would write over each other's textures
+def check_targets(jobs):
+    targets = {}
+    for file_path, out_dir in jobs:
+        target = os.path.normcase(os.path.join(os.path.abspath(out_dir or ''),
+                                               os.path.splitext(os.path.basename(file_path))[0]))
+        if target in targets:
+            raise ValueError(f"{file_path} and {targets[target]} would export to the same files")
+        targets[target] = file_path
+
+
+# Run export tasks across the pool (or in-process for a single worker) and
+# return their outcomes in task order, merging worker timings as they arrive
+def run_tasks(tasks, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [merge_timings(outcome) for outcome in map(export_texture_task, tasks)]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(workers) as pool:
+        return [merge_timings(outcome) for outcome in pool.map(export_texture_task, tasks, chunksize=chunksize)]
+
+
+# (files, error, records) -> (files, error), keeping the records if profiling
+def merge_timings(outcome):
+    files, error, records = outcome
+    if records and texprof.timings is not None:
+        texprof.timings.add(records)
+    return files, error
+
+
+# Regroup the ordered per-texture outcomes into one result per TEX file
+def collect_results(results, outcomes):
+    outcomes = iter(outcomes)
+    collected = []
+    for file_path, num_textures, error, texinfo_file in results:
+        files = [texinfo_file] if texinfo_file else []
+        errors = [error] if error else []
+        for _ in range(num_textures):
+            texture_files, texture_error = next(outcomes)
+            files += texture_files
+            if texture_error:
+                errors.append(texture_error)
+        collected.append((file_path, files, errors))
+    return collected
@@ -0,0 +1,408 @@
+import argparse
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from clut import export_clut, import_clut
+from texcodec import clut_to_array, decode_texture, pack_indices
+from texfile import TexFile, TexWriter
+
+SUITE_STAGES = ('parse', 'clut', 'decode', 'encode', 'pack', 'write')
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(SRC_DIR), 'Individual Scripts')
+
+# Modules timed by the startup benchmark: their directory, and the modules
+# importing them must not load (those belong to the code paths that use them)
+STARTUP_TARGETS = {
+    'hauntinginandex': (SRC_DIR, ('numpy', 'PIL', 'tkinter', 'matplotlib', 'concurrent.futures', 'hgtex')),
+    'hgtex': (SRC_DIR, ('PIL', 'tkinter', 'matplotlib')),
+    'texverify': (SRC_DIR, ('PIL', 'tkinter', 'matplotlib')),
+    'texpack': (SRC_DIR, ('PIL', 'tkinter', 'matplotlib')),
+    'haunting': (SCRIPTS_DIR, ('tkinter', 'matplotlib')),
+    'hauntingreimport': (SCRIPTS_DIR, ('tkinter', 'matplotlib')),
+}
+
+
+# The original per-byte decode loop, kept as the baseline to compare against
+def legacy_decode(pixel_data, width, height, bpp, clut_data):
+    pixel_data_size = len(pixel_data)
+    expanded_pixels = np.zeros((height, width, 4), dtype=np.uint8)
+    if bpp == 4:
+        for i in range(pixel_data_size):
+            low_nibble = pixel_data[i] & 0x0F
+            high_nibble = (pixel_data[i] & 0xF0) >> 4
+            y, x = divmod(2 * i, width)
+            if y < height:
+                if low_nibble < len(clut_data):
+                    expanded_pixels[y, x] = clut_data[low_nibble]
+                if x + 1 < width and high_nibble < len(clut_data):
+                    expanded_pixels[y, x + 1] = clut_data[high_nibble]
+    else:
+        for i in range(pixel_data_size):
+            pixel_value = pixel_data[i]
+            if pixel_value < len(clut_data):
+                expanded_pixels[i // width, i % width] = clut_data[pixel_value]
+    return expanded_pixels
+
+
+# The original per-pixel packing loop from import_textures
+def legacy_pack(pixels, bpp):
+    height, width = pixels.shape
+    pixel_data = bytearray()
+    if bpp == 4:
+        for y in range(height):
+            for x in range(0, width, 2):
+                low_nibble = pixels[y, x] & 0x0F
+                high_nibble = (pixels[y, x + 1] & 0x0F) if (x + 1) < width else 0
+                pixel_data.append((high_nibble << 4) | low_nibble)
+    else:
+        for y in range(height):
+            for x in range(width):
+                pixel_data.append(pixels[y, x])
+    return pixel_data
+
+
+# The original CLUT loops: unswizzle and alpha scaling on export...
+def legacy_export_clut(clut_data_raw):
+    clut_entries = [clut_data_raw[i:i+4] for i in range(0, len(clut_data_raw), 4)]
+    clut_twiddled = []
+    for i in range(0, 256, 32):
+        clut_twiddled.extend(clut_entries[i:i+8])    # 0-7
+        clut_twiddled.extend(clut_entries[i+16:i+24]) # 16-23
+        clut_twiddled.extend(clut_entries[i+8:i+16])  # 8-15
+        clut_twiddled.extend(clut_entries[i+24:i+32]) # 24-31
+    return [(entry[0], entry[1], entry[2], min(entry[3] * 2, 255)) for entry in clut_twiddled]
+
+
+# ...and the alpha rule, flip, gap/padding and swizzle on import
+def legacy_import_clut(palette, num_colors):
+    clut_data_raw = palette[:num_colors * 3]
+    clut_data = []
+    for i in range(0, num_colors * 3, 3):
+        r, g, b = clut_data_raw[i], clut_data_raw[i + 1], clut_data_raw[i + 2]
+        alpha = 0x80 if (r, g, b) != (0, 0, 0) else 0x00
+        clut_data.append((r, g, b, alpha))
+    flipped_clut = clut_data[::-1]
+    if num_colors == 16:
+        combined_clut = flipped_clut[:8] + [(0x00, 0x00, 0x00, 0x00)] * 8 + flipped_clut[8:]
+        return combined_clut + [(0x00, 0x00, 0x00, 0x00)] * (256 - len(combined_clut))
+    clut_twiddled = []
+    for i in range(0, 256, 32):
+        clut_twiddled.extend(flipped_clut[i:i+8])
+        clut_twiddled.extend(flipped_clut[i+16:i+24])
+        clut_twiddled.extend(flipped_clut[i+8:i+16])
+        clut_twiddled.extend(flipped_clut[i+24:i+32])
+    return clut_twiddled
+
+
+# Best-of-N wall time for a callable
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_decode(width, height, bpp, repeat, rng, truncate=0):
+    pixel_data_size = (width * height) // (2 if bpp == 4 else 1) - truncate
+    pixel_data = rng.integers(0, 256, pixel_data_size, dtype=np.uint8).tobytes()
+    clut_data = [tuple(int(c) for c in entry) for entry in rng.integers(0, 256, (256 - truncate, 4))]
+    clut = clut_to_array(clut_data)
+
+    expected = legacy_decode(pixel_data, width, height, bpp, clut_data)
+    actual = decode_texture(pixel_data, width, height, bpp, clut)
+    if not np.array_equal(expected, actual):
+        raise AssertionError(f"Vectorized decode differs from the loop for {width}x{height} {bpp}bpp")
+
+    legacy = best_time(lambda: legacy_decode(pixel_data, width, height, bpp, clut_data), repeat)
+    vectorized = best_time(lambda: decode_texture(pixel_data, width, height, bpp, clut), repeat)
+    print(f"{width}x{height} {bpp}bpp: loop {legacy * 1000:.1f} ms, "
+          f"vectorized {vectorized * 1000:.2f} ms, speedup {legacy / vectorized:.0f}x")
+
+
+def bench_pack(width, height, bpp, repeat, rng):
+    pixels = rng.integers(0, 256, (height, width), dtype=np.uint8)
+    if legacy_pack(pixels, bpp) != pack_indices(pixels, bpp):
+        raise AssertionError(f"Vectorized pack differs from the loop for {width}x{height} {bpp}bpp")
+
+    legacy = best_time(lambda: legacy_pack(pixels, bpp), repeat)
+    vectorized = best_time(lambda: pack_indices(pixels, bpp), repeat)
+    print(f"pack {width}x{height} {bpp}bpp: loop {legacy * 1000:.1f} ms, "
+          f"vectorized {vectorized * 1000:.2f} ms, speedup {legacy / vectorized:.0f}x")
+
+
+def bench_clut(repeat, rng):
+    for entries in (200, 13, 256):
+        clut_data_raw = rng.integers(0, 256, entries * 4, dtype=np.uint8).tobytes()
+        expected = np.array(legacy_export_clut(clut_data_raw), dtype=np.uint8)
+        if not np.array_equal(expected, export_clut(np.frombuffer(clut_data_raw, np.uint8))):
+            raise AssertionError(f"Export CLUT differs from the loop for {entries} entries")
+    palette = [int(c) for c in rng.integers(0, 256, 768)]
+    palette[30:33] = [0, 0, 0]  # Black gets alpha 0
+    for num_colors in (16, 256):
+        expected = np.array(legacy_import_clut(palette, num_colors), dtype=np.uint8)
+        if not np.array_equal(expected, import_clut(palette, num_colors)):
+            raise AssertionError(f"Import CLUT differs from the loop for {num_colors} colors")
+
+    raw = np.frombuffer(clut_data_raw, np.uint8)
+    legacy = best_time(lambda: (legacy_export_clut(clut_data_raw), legacy_import_clut(palette, 256)), repeat)
+    vectorized = best_time(lambda: (export_clut(raw), import_clut(palette, 256)), repeat)
+    print(f"clut export+import: loop {legacy * 1000:.2f} ms, "
+          f"vectorized {vectorized * 1000:.3f} ms, speedup {legacy / vectorized:.0f}x")
+
+
+# Write a synthetic TEX archive: num_textures random 0x13/0x14 textures with
+# power-of-two sides between min_size and max_size, random pixels and CLUTs
+def write_synthetic_tex(path, rng, num_textures, min_size=16, max_size=1024):
+    exponents = np.arange(int(np.log2(min_size)), int(np.log2(max_size)) + 1)
+    layout = []
+    for _ in range(num_textures):
+        width, height = (int(2 ** e) for e in rng.choice(exponents, 2))
+        format_flag_value = int(rng.choice((0x13, 0x14)))
+        layout.append((format_flag_value, width, height, rng.integers(0, 256, 4, dtype=np.uint8).tobytes()))
+
+    with TexWriter(path, layout) as writer:
+        for format_flag_value, width, height, unknown_bytes in layout:
+            num_colors = 16 if format_flag_value == 0x14 else 256
+            pixels = rng.integers(0, num_colors, (height, width), dtype=np.uint8)
+            writer.write_texture(pixels, rng.integers(0, 256, 1024, dtype=np.uint8))
+
+
+# Generate a reproducible corpus of synthetic TEX files in out_dir
+def generate_corpus(out_dir, seed, files, max_textures, min_size=16, max_size=1024):
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for number in range(files):
+        path = os.path.join(out_dir, f"synthetic{number:04d}.TEX")
+        write_synthetic_tex(path, rng, int(rng.integers(1, max_textures + 1)), min_size, max_size)
+        paths.append(path)
+    return paths
+
+
+# Time every pipeline stage separately over a set of TEX files: header parse,
+# CLUT processing (export and import side), decode, BMP encode, pack and write
+def run_suite(paths):
+    seconds = dict.fromkeys(SUITE_STAGES, 0.0)
+    processed = dict.fromkeys(SUITE_STAGES, 0)
+    num_textures = 0
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for path in paths:
+            start = time.perf_counter()
+            tex = TexFile(path)
+            seconds['parse'] += time.perf_counter() - start
+            processed['parse'] += 0x10 + len(tex) * 16
+
+            layout = []
+            blocks = []
+            for idx in range(len(tex)):
+                width, height = tex.size(idx)
+                bpp = tex.bpp(idx)
+                pixel_data_size = tex.pixel_data_size(idx)
+
+                start = time.perf_counter()
+                clut_data = export_clut(tex.clut(idx))
+                clut = clut_to_array(clut_data)
+                tex_clut = import_clut(clut[:1 << bpp, :3][::-1].reshape(-1).tolist(), 1 << bpp)
+                seconds['clut'] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                expanded_pixels = tex.decode(idx, clut)
+                seconds['decode'] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                image = Image.fromarray(expanded_pixels[..., :3], 'RGB')
+                image.convert('P', palette=Image.ADAPTIVE, colors=256).save(io.BytesIO(), format='BMP')
+                seconds['encode'] += time.perf_counter() - start
+
+                indices, mask = tex.indices(idx)
+                start = time.perf_counter()
+                block = pack_indices(indices, bpp)
+                seconds['pack'] += time.perf_counter() - start
+
+                layout.append((int(tex.index['format'][idx]), width, height, bytes(tex.index['unknown'][idx])))
+                blocks.append(block + tex_clut.tobytes())
+                for stage in ('decode', 'encode', 'pack', 'write'):
+                    processed[stage] += pixel_data_size
+                processed['clut'] += 2 * 1024
+            num_textures += len(tex)
+            tex.close()
+
+            start = time.perf_counter()
+            with TexWriter(os.path.join(scratch, 'out.TEX'), layout) as writer:
+                for block in blocks:
+                    writer.write_packed(block)
+            seconds['write'] += time.perf_counter() - start
+
+    stages = {}
+    for stage in SUITE_STAGES:
+        elapsed = seconds[stage]
+        stages[stage] = {
+            'seconds': round(elapsed, 6),
+            'mb_per_s': round(processed[stage] / elapsed / 1e6, 3) if elapsed else None,
+            'textures_per_s': round(num_textures / elapsed, 1) if elapsed else None,
+        }
+    return {
+        'files': len(paths),
+        'textures': num_textures,
+        'bytes': sum(os.path.getsize(path) for path in paths),
+        'total_seconds': round(sum(seconds.values()), 6),
+        'stages': stages,
+    }
+
+
+def run_loops(args):
+    rng = np.random.default_rng(args.seed)
+    # Odd widths and truncated data must match the loop as well
+    for width, height in ((7, 5), (33, 17)):
+        for bpp in (4, 8):
+            bench_decode(width, height, bpp, 1, rng)
+            bench_decode(width, height, bpp, 1, rng, truncate=5)
+            bench_pack(width, height, bpp, 1, rng)
+    bench_clut(args.repeat, rng)
+    for bpp in (8, 4):
+        bench_decode(args.width, args.height, bpp, args.repeat, rng)
+        bench_pack(args.width, args.height, bpp, args.repeat, rng)
+
+
+def run_suite_command(args):
+    if args.corpus and glob.glob(os.path.join(args.corpus, '*.TEX')):
+        paths = sorted(glob.glob(os.path.join(args.corpus, '*.TEX')))
+        report = run_suite(paths)
+    elif args.corpus:
+        paths = generate_corpus(args.corpus, args.seed, args.files, args.max_textures, args.min_size, args.max_size)
+        report = run_suite(paths)
+    else:
+        with tempfile.TemporaryDirectory() as corpus:
+            paths = generate_corpus(corpus, args.seed, args.files, args.max_textures, args.min_size, args.max_size)
+            report = run_suite(paths)
+    report['seed'] = args.seed
+
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json_file.write(output + '\n')
+    print(output)
+
+
+# Import module in a fresh interpreter with -X importtime. Returns the
+# cumulative import time of every module loaded, in microseconds, the modules
+# module imported directly, and the wall time of the whole process in seconds.
+def import_profile(module, path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (path, os.environ.get('PYTHONPATH')))))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=path, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed: {result.stderr.strip().splitlines()[-1]}")
+    modules = {}
+    children = []
+    direct = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix('import time:').split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        modules[name] = int(fields[1])
+        # A module is listed after everything it imports, indented one level deeper
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        if depth == 1:
+            children.append(name)
+        elif depth == 0:
+            if name == module:
+                direct = children
+            children = []
+    return modules, direct, seconds
+
+
+# Time the import of each entry module (best of args.repeat runs) and check
+# that none of them loads a module it shouldn't. Returns 1 if any check or
+# the --max-ms budget fails, so it can guard a build.
+def run_startup(args):
+    names = args.modules or list(STARTUP_TARGETS)
+    interpreter_seconds = min(import_profile('sys', SRC_DIR)[2] for _ in range(args.repeat))
+    report = {'python': sys.version.split()[0], 'interpreter_ms': round(interpreter_seconds * 1000, 2),
+              'modules': {}}
+    failures = []
+    for name in names:
+        path, forbidden = STARTUP_TARGETS.get(name, (SRC_DIR, ()))
+        modules, direct, seconds = min((import_profile(name, path) for _ in range(args.repeat)),
+                                       key=lambda profile: profile[0][name])
+        import_ms = modules[name] / 1000
+        heaviest = sorted(direct, key=modules.get, reverse=True)[:5]
+        loaded = [module for module in forbidden if module in modules]
+        report['modules'][name] = {
+            'import_ms': round(import_ms, 2),
+            'process_ms': round(seconds * 1000, 2),
+            'heaviest': {other: round(modules[other] / 1000, 2) for other in heaviest},
+            'unwanted': loaded,
+        }
+        if loaded:
+            failures.append(f"import {name} loads {', '.join(loaded)}")
+        if args.max_ms is not None and import_ms > args.max_ms:
+            failures.append(f"import {name} takes {import_ms:.1f} ms, over the {args.max_ms:g} ms budget")
+
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json_file.write(output + '\n')
+    print(output)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TEX conversion benchmarks")
+    commands = parser.add_subparsers(dest='command')
+
+    loops_parser = commands.add_parser('loops', help="Compare the vectorized code against the original loops (default)")
+    loops_parser.add_argument('--width', type=int, default=512)
+    loops_parser.add_argument('--height', type=int, default=512)
+    loops_parser.add_argument('--repeat', type=int, default=3)
+    loops_parser.add_argument('--seed', type=int, default=0)
+
+    suite_parser = commands.add_parser('suite', help="Time each pipeline stage over a synthetic TEX corpus, as JSON")
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument('--files', type=int, default=6)
+    suite_parser.add_argument('--max-textures', type=int, default=255)
+    suite_parser.add_argument('--min-size', type=int, default=16)
+    suite_parser.add_argument('--max-size', type=int, default=1024)
+    suite_parser.add_argument('--corpus', metavar='DIR',
+                              help="Keep the corpus here (reused if it already holds TEX files)")
+    suite_parser.add_argument('--json', metavar='PATH', help="Also write the report to this file")
+
+    startup_parser = commands.add_parser('startup',
+                                         help="Import-time profile of the entry modules; fails if one loads "
+                                              "a heavy module it doesn't need or is over budget")
+    startup_parser.add_argument('modules', nargs='*', help="Modules to time (default: all entry modules)")
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.add_argument('--max-ms', type=float, help="Fail if any import takes longer than this")
+    startup_parser.add_argument('--json', metavar='PATH', help="Also write the report to this file")
+
+    args = parser.parse_args()
+    if args.command == 'startup':
+        return run_startup(args)
+    if args.command == 'suite':
+        run_suite_command(args)
+    else:
+        if args.command is None:
+            args = loops_parser.parse_args([])
+        run_loops(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
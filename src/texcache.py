@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+CACHE_FILE = 'hgtex-cache.sqlite'
+CACHE_VERSION = b'hgtex-cache-2'  # Bump when export or import output changes
+
+
+# Content hash of the given byte strings (header, pixels, CLUT, options...)
+def content_key(*parts):
+    digest = hashlib.blake2b(CACHE_VERSION, digest_size=20)
+    for part in parts:
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# On-disk cache for incremental runs, a single SQLite file in cache_dir.
+# Export: remembers which content key produced which output files, so an
+# unchanged texture whose outputs are still as written can be skipped.
+# Import: keeps packed texture blocks (pixels + CLUT) by the key of the image
+# they came from, evicting the least recently used ones beyond max_bytes.
+class TexCache:
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        # Parallel exports share the file, so wait for locks rather than fail
+        self._db = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), timeout=60)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS exports '
+                             '(output TEXT PRIMARY KEY, key TEXT, mtime_ns INTEGER, size INTEGER)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS blobs '
+                             '(key TEXT PRIMARY KEY, data BLOB, size INTEGER, atime REAL)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    # True if every output file was last written for key and hasn't changed since
+    def export_is_current(self, key, output_files):
+        for output_file in output_files:
+            row = self._db.execute('SELECT key, mtime_ns, size FROM exports WHERE output = ?',
+                                   (os.path.abspath(output_file),)).fetchone()
+            try:
+                stat = os.stat(output_file)
+            except OSError:
+                return False
+            if row != (key, stat.st_mtime_ns, stat.st_size):
+                return False
+        return True
+
+    def record_export(self, key, output_files):
+        with self._db:
+            for output_file in output_files:
+                stat = os.stat(output_file)
+                self._db.execute('INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?)',
+                                 (os.path.abspath(output_file), key, stat.st_mtime_ns, stat.st_size))
+
+    # Cached bytes for key, or None
+    def get(self, key):
+        row = self._db.execute('SELECT data FROM blobs WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute('UPDATE blobs SET atime = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, data):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)',
+                             (key, bytes(data), len(data), time.time()))
+            self.evict()
+
+    # Drop least recently used blobs until the cache fits in max_bytes
+    def evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute('SELECT key, size FROM blobs ORDER BY atime').fetchall():
+            self._db.execute('DELETE FROM blobs WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,87 @@
+import numpy as np
+
+
+# Turn a list of RGBA tuples into a (256, 4) lookup table. Missing entries
+# (short or truncated CLUTs) stay zero, which is what unmapped pixels get too.
+def clut_to_array(clut_data):
+    table = np.zeros((256, 4), dtype=np.uint8)
+    if len(clut_data):
+        entries = np.asarray(clut_data, dtype=np.uint8).reshape(-1, 4)[:256]
+        table[:len(entries)] = entries
+    return table
+
+
+# Unpack TEX pixel data into a (height, width) array of CLUT indices.
+# Also returns a mask of the pixels the data actually covers: truncated data
+# leaves the tail uncovered, and for odd widths the high nibble that would
+# wrap onto the next row is dropped, exactly like the original per-byte loop.
+def unpack_indices(pixel_data, width, height, bpp):
+    return unpack_rows(pixel_data, width, height, bpp, 0, height)
+
+
+# unpack_indices for rows first_row to end_row only; just the bytes holding
+# those rows are read, so a texture can be decoded a band at a time.
+def unpack_rows(pixel_data, width, height, bpp, first_row, end_row):
+    start = first_row * width  # Pixel range of the band
+    count = (end_row - first_row) * width
+    indices = np.zeros(count, dtype=np.uint8)
+    mask = np.zeros(count, dtype=bool)
+
+    if bpp == 4:
+        # Low nibble is the left pixel, high nibble the right one; an odd
+        # start falls on the high nibble of its byte
+        available = min(len(pixel_data) * 2, width * height)
+        n = max(0, min(start + count, available) - start)
+        data = np.frombuffer(pixel_data[start // 2:(start + n + 1) // 2], dtype=np.uint8)
+        stream = np.empty(data.size * 2, dtype=np.uint8)
+        stream[0::2] = data & 0x0F
+        stream[1::2] = data >> 4
+        indices[:n] = stream[start % 2:start % 2 + n]
+        mask[:n] = True
+        if width % 2:
+            wrapped = np.arange(max(first_row, 1) * width, start + n, width)
+            wrapped = wrapped[wrapped % 2 == 1] - start
+            indices[wrapped] = 0
+            mask[wrapped] = False
+    else:
+        data = np.frombuffer(pixel_data[start:start + count], dtype=np.uint8)
+        indices[:data.size] = data
+        mask[:data.size] = True
+
+    return indices.reshape(end_row - first_row, width), mask.reshape(end_row - first_row, width)
+
+
+# Decode TEX pixel data to a (height, width, 4) RGBA array with one fancy-index
+# through the (256, 4) CLUT table.
+def decode_texture(pixel_data, width, height, bpp, clut):
+    indices, mask = unpack_indices(pixel_data, width, height, bpp)
+    expanded_pixels = clut[indices]
+    expanded_pixels[~mask] = 0
+    return expanded_pixels
+
+
+# Number of bytes pack_indices produces; each 4bpp row is padded to a whole byte
+def packed_size(width, height, bpp):
+    if bpp == 4:
+        return height * ((width + 1) // 2)
+    return width * height
+
+
+# Pack a (height, width) index array into TEX pixel bytes. The bytes are written
+# straight into out (any writable buffer) at offset; a new bytearray is only
+# allocated when no output buffer is given.
+def pack_indices(pixels, bpp, out=None, offset=0):
+    height, width = pixels.shape
+    size = packed_size(width, height, bpp)
+    if out is None:
+        out = bytearray(size)
+    dest = np.frombuffer(out, dtype=np.uint8, count=size, offset=offset)
+
+    if bpp == 4:
+        # Two 4-bit indices per byte as (high << 4) | low, odd widths padded with 0
+        dest = dest.reshape(height, (width + 1) // 2)
+        np.bitwise_and(pixels[:, 0::2], 0x0F, out=dest)
+        dest[:, :width // 2] |= (pixels[:, 1::2] & 0x0F) << 4
+    else:
+        dest[:] = pixels.reshape(-1)
+    return out
@@ -0,0 +1,116 @@
+import json
+import os
+
+import texprof
+from texbatch import check_targets, run_tasks
+from texcache import content_key
+from texfile import TexFile
+from texprof import log, stage
+
+MANIFEST_VERSION = 1
+
+
+# Hash every texture of the given TEX files. jobs is a list of (tex_path,
+# out_dir) pairs as for export_batch. Returns the entries in archive order as
+# dicts with the archive, 1-based texture number, pixel and CLUT hashes and the
+# key of the whole texture (format, size, pixels and CLUT), plus the errors of
+# archives that couldn't be read.
+def build_index(jobs):
+    entries = []
+    errors = []
+    for file_path, out_dir in jobs:
+        try:
+            with stage('parse', file_path):
+                tex = TexFile(file_path)
+            with tex:
+                for idx in range(len(tex)):
+                    with stage('hash', file_path, idx + 1):
+                        shape = bytes(tex.header(idx)[:8])  # Format, width and height
+                        pixels = content_key(shape, tex.pixel_data(idx))
+                        clut = content_key(tex.clut_data(idx))
+                    entries.append({
+                        'archive': file_path,
+                        'texture': idx + 1,
+                        'key': content_key(pixels.encode(), clut.encode()),
+                        'pixels': pixels,
+                        'clut': clut,
+                        'out_dir': out_dir,
+                    })
+        except Exception as e:
+            errors.append(f"{file_path}: {e}")
+    return entries, errors
+
+
+# Export each distinct texture of many TEX files once and write a JSON
+# manifest mapping every (archive, texture) to the shared image and CLUT files.
+# A texture is exported under the name of its first occurrence, in that
+# archive's out_dir. Paths in the manifest are relative to the manifest file.
+# workers, cache_dir and options are as for export_batch. Returns the manifest
+# and the list of errors.
+def export_deduplicated(jobs, manifest_path, workers=None, cache_dir=None, **options):
+    check_targets(jobs)
+    entries, errors = build_index(jobs)
+
+    # First occurrence of every key, in archive order
+    first = {}
+    for entry in entries:
+        first.setdefault(entry['key'], entry)
+    for entry in first.values():
+        if entry['out_dir']:
+            os.makedirs(entry['out_dir'], exist_ok=True)
+
+    settings = (texprof.verbosity, texprof.timings is not None)
+    tasks = [(entry['archive'], entry['texture'] - 1, entry['out_dir'], cache_dir, options, settings)
+             for entry in first.values()]
+    outputs = {}
+    for (key, entry), (files, error) in zip(first.items(), run_tasks(tasks, workers)):
+        if error:
+            errors.append(f"{entry['archive']}: {error}")
+        else:
+            outputs[key] = files
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    archives = {}
+    for entry in entries:
+        record = {name: entry[name] for name in ('texture', 'key', 'pixels', 'clut')}
+        files = outputs.get(entry['key'])
+        if files:
+            clut_file, image_file = files
+            record['image'] = os.path.relpath(image_file, manifest_dir).replace(os.sep, '/')
+            record['clut_file'] = os.path.relpath(clut_file, manifest_dir).replace(os.sep, '/')
+        archive = os.path.relpath(entry['archive'], manifest_dir).replace(os.sep, '/')
+        archives.setdefault(archive, []).append(record)
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'textures': len(entries),
+        'unique': len(first),
+        'unique_pixels': len({entry['pixels'] for entry in entries}),
+        'unique_cluts': len({entry['clut'] for entry in entries}),
+        'archives': archives,
+    }
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    log(1, f"{len(entries)} textures, {len(first)} unique, manifest written to {manifest_path}")
+    return manifest, errors
+
+
+# Image files of an archive in texture order, read back from a manifest, so
+# the shared exports can be fed to import_tex. archive is matched by path
+# relative to the manifest, or by file name when that is unambiguous.
+def manifest_images(manifest_path, archive):
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    archives = manifest['archives']
+    name = os.path.relpath(os.path.abspath(archive), manifest_dir).replace(os.sep, '/')
+    if name not in archives:
+        matches = [key for key in archives if os.path.basename(key).lower() == os.path.basename(archive).lower()]
+        if len(matches) != 1:
+            raise ValueError(f"{archive} is not in {manifest_path}")
+        name = matches[0]
+    records = sorted(archives[name], key=lambda record: record['texture'])
+    missing = [record['texture'] for record in records if 'image' not in record]
+    if missing:
+        raise ValueError(f"{name}: textures {missing} were not exported")
+    return [os.path.join(manifest_dir, record['image']) for record in records]
@@ -0,0 +1,261 @@
+import mmap
+import os
+
+import numpy as np
+
+from texcodec import decode_texture, pack_indices, packed_size, unpack_indices, unpack_rows
+from texprof import stage
+
+# A 16-byte texture header as stored in the table at 0x10
+HEADER_DTYPE = np.dtype([
+    ('format', '<u4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('unknown', 'u1', 4),
+    ('relative_offset', '<u4'),
+])
+
+# Parsed texture index: the header fields plus the absolute data offset
+INDEX_DTYPE = np.dtype([
+    ('format', '<u4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('unknown', 'u1', 4),
+    ('offset', '<i8'),
+])
+
+CLUT_SIZE = 1024  # 256 colors * 4 bytes per color (RGBA)
+
+
+# Bits per pixel for a format flag
+def format_bpp(format_flag_value):
+    if format_flag_value == 0x13:
+        return 8
+    if format_flag_value == 0x14:
+        return 4
+    raise ValueError(f"Unsupported format flag: {format_flag_value}")
+
+
+# Number of complete headers in a file of file_size bytes whose first byte
+# says num_textures; a truncated table is cut short
+def table_length(num_textures, file_size):
+    return max(0, min(num_textures, (file_size - 0x10) // 16))
+
+
+# Header table bytes -> INDEX_DTYPE array
+def parse_table(table_data):
+    table = np.frombuffer(table_data, dtype=HEADER_DTYPE)
+    index = np.zeros(len(table), dtype=INDEX_DTYPE)
+    for field in ('format', 'width', 'height', 'unknown'):
+        index[field] = table[field]
+    # Data offsets are relative to the start of each header
+    index['offset'] = 0x10 + np.arange(len(table)) * 16 + table['relative_offset']
+    return index
+
+
+# Read only the header table of a TEX file, without mapping or touching the
+# texture data. Returns (index, declared texture count, file size).
+def read_index(path):
+    with open(path, 'rb') as tex_file:
+        file_size = os.fstat(tex_file.fileno()).st_size
+        declared = tex_file.read(1)[0] if file_size else 0
+        num_textures = table_length(declared, file_size)
+        tex_file.seek(0x10)
+        return parse_table(tex_file.read(num_textures * 16)), declared, file_size
+
+
+# Check a header table against the file it came from in one pass: format
+# flags, dimensions, data offsets and sizes. Returns a list of problems, empty
+# if every texture can be exported.
+def check_index(index, declared, file_size):
+    problems = []
+    if declared > len(index):
+        problems.append(f"header table holds {len(index)} of {declared} textures, the file is truncated")
+    if not len(index):
+        return problems
+
+    formats = index['format']
+    widths = index['width'].astype(np.int64)
+    heights = index['height'].astype(np.int64)
+    offsets = index['offset']
+    sizes = np.where(formats == 0x14, widths * heights // 2, widths * heights) + CLUT_SIZE
+    # A block of unknown format has no known size, so it is left out of the
+    # bounds and overlap checks rather than guessed at
+    known = np.isin(formats, (0x13, 0x14))
+    table_end = 0x10 + len(index) * 16
+
+    for idx in np.flatnonzero(~known):
+        problems.append(f"texture {idx + 1}: unsupported format flag {hex(int(formats[idx]))}")
+    for idx in np.flatnonzero((widths == 0) | (heights == 0)):
+        problems.append(f"texture {idx + 1}: empty {int(widths[idx])}x{int(heights[idx])} texture")
+    for idx in np.flatnonzero(offsets < table_end):
+        problems.append(f"texture {idx + 1}: data at {hex(int(offsets[idx]))} overlaps the header table")
+    for idx in np.flatnonzero(known & (offsets + sizes > file_size)):
+        problems.append(f"texture {idx + 1}: {int(sizes[idx])} bytes at {hex(int(offsets[idx]))} "
+                        f"run past the end of the file ({hex(file_size)})")
+
+    # Blocks sorted by offset must not run into the next one
+    order = np.flatnonzero(known)[np.argsort(offsets[known], kind='stable')]
+    ends = offsets[order] + sizes[order]
+    for position in np.flatnonzero(ends[:-1] > offsets[order][1:]):
+        first, second = order[position], order[position + 1]
+        problems.append(f"texture {first + 1}: data overlaps texture {second + 1}")
+    return problems
+
+
+# Read-only, memory-mapped view of a TEX archive. Opening one only parses the
+# header table into `index`; pixel and CLUT regions are zero-copy views into the
+# mapping, so nothing is read from disk until a texture is actually used.
+class TexFile:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files, an empty buffer behaves the same here
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.data = memoryview(self._map)
+
+        num_textures = table_length(self.data[0] if size else 0, size)
+        self.index = parse_table(self.data[0x10:0x10 + num_textures * 16])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data.release()
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # Views handed out are still alive; the mapping goes with them
+        self._file.close()
+
+    # Raw 16-byte header of texture idx
+    def header(self, idx):
+        start = 0x10 + idx * 16
+        return self.data[start:start + 16]
+
+    def bpp(self, idx):
+        return format_bpp(int(self.index['format'][idx]))
+
+    def size(self, idx):
+        return int(self.index['width'][idx]), int(self.index['height'][idx])
+
+    def pixel_data_size(self, idx):
+        width, height = self.size(idx)
+        return (width * height) // (2 if self.bpp(idx) == 4 else 1)
+
+    # Zero-copy view of the pixel data; shorter than expected if the file is truncated
+    def pixel_data(self, idx):
+        start = int(self.index['offset'][idx])
+        return self.data[start:start + self.pixel_data_size(idx)]
+
+    # Zero-copy view of the 1024-byte CLUT that follows the pixel data
+    def clut_data(self, idx):
+        start = int(self.index['offset'][idx]) + self.pixel_data_size(idx)
+        return self.data[start:start + CLUT_SIZE]
+
+    # The raw CLUT as an (N, 4) uint8 array view, N is 256 unless truncated
+    def clut(self, idx):
+        clut_data_raw = self.clut_data(idx)
+        return np.frombuffer(clut_data_raw, dtype=np.uint8, count=len(clut_data_raw) // 4 * 4).reshape(-1, 4)
+
+    # (height, width) CLUT indices and coverage mask, see texcodec.unpack_indices
+    def indices(self, idx):
+        width, height = self.size(idx)
+        return unpack_indices(self.pixel_data(idx), width, height, self.bpp(idx))
+
+    # indices() for rows first_row to end_row only, read from just those bytes
+    def index_rows(self, idx, first_row, end_row):
+        width, height = self.size(idx)
+        return unpack_rows(self.pixel_data(idx), width, height, self.bpp(idx), first_row, end_row)
+
+    # Decode texture idx to RGBA through a (256, 4) lookup table
+    def decode(self, idx, clut):
+        width, height = self.size(idx)
+        return decode_texture(self.pixel_data(idx), width, height, self.bpp(idx), clut)
+
+
+# Streams a TEX archive to disk one texture at a time. The header table is
+# computed up front from the texture dimensions alone and written first; after
+# that each texture's packed pixels and CLUT go out together in a single write
+# from one reused scratch buffer, so only one texture is ever held in memory.
+# textures is a list of (format_flag_value, width, height, unknown_bytes).
+class TexWriter:
+    def __init__(self, path, textures):
+        self.path = path
+        self.textures = list(textures)
+        num_textures = len(self.textures)
+
+        table = bytearray(0x10 + num_textures * 16)
+        table[0:1] = num_textures.to_bytes(1, 'big')
+        data_offset = 0x10 + num_textures * 16  # Offset written to the headers
+        self.sizes = []
+        for idx, (format_flag_value, width, height, unknown_bytes) in enumerate(self.textures):
+            bpp = 4 if format_flag_value == 0x14 else 8  # Assume 0x14 means 4bpp
+            header_offset = 0x10 + idx * 16
+            header = bytearray(16)
+            header[0:4] = format_flag_value.to_bytes(4, 'little')
+            header[4:6] = width.to_bytes(2, 'little')
+            header[6:8] = height.to_bytes(2, 'little')
+            header[8:12] = unknown_bytes
+            header[12:16] = (data_offset - header_offset).to_bytes(4, 'little')  # Relative data offset
+            table[header_offset:header_offset + 16] = header
+
+            # Headers keep the (width * height) // 2 size; the data itself pads
+            # odd-width 4bpp rows to a whole byte, as it always has
+            data_offset += (width * height) // (2 if bpp == 4 else 1) + CLUT_SIZE
+            self.sizes.append(packed_size(width, height, bpp))
+
+        self._buffer = bytearray(max(self.sizes, default=0) + CLUT_SIZE)
+        self._next = 0
+        self._file = open(path, 'wb')
+        self._file.write(table)
+
+    def __enter__(self):
+        return self
+
+    # A failed conversion must not leave a half-written archive behind
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if exc_type is not None:
+            os.remove(self.path)
+
+    def close(self):
+        self._file.close()
+
+    # Pack the next texture's (height, width) indices and append its
+    # 1024-byte CLUT block (any buffer, e.g. a (256, 4) uint8 array), in one
+    # write. Returns a view of the block written, valid until the next call.
+    def write_texture(self, pixels, clut_data):
+        format_flag_value, width, height, unknown_bytes = self.textures[self._next]
+        if pixels.shape != (height, width):
+            raise ValueError(f"Texture {self._next + 1} is {pixels.shape[1]}x{pixels.shape[0]}, "
+                             f"expected {width}x{height}")
+        clut_data = memoryview(clut_data).cast('B')
+        if len(clut_data) != CLUT_SIZE:
+            raise ValueError(f"Texture {self._next + 1} CLUT is {len(clut_data)} bytes, expected {CLUT_SIZE}")
+        size = self.sizes[self._next]
+        with stage('pack', self.path, self._next + 1):
+            pack_indices(pixels, 4 if format_flag_value == 0x14 else 8, self._buffer, 0)
+            self._buffer[size:size + CLUT_SIZE] = clut_data
+        block = memoryview(self._buffer)[:size + CLUT_SIZE]
+        with stage('write', self.path, self._next + 1):
+            self._file.write(block)
+        self._next += 1
+        return block
+
+    # Write the next texture from an already packed block, as returned by write_texture
+    def write_packed(self, block):
+        if len(block) != self.sizes[self._next] + CLUT_SIZE:
+            raise ValueError(f"Texture {self._next + 1} block is {len(block)} bytes, "
+                             f"expected {self.sizes[self._next] + CLUT_SIZE}")
+        with stage('write', self.path, self._next + 1):
+            self._file.write(block)
+        self._next += 1
@@ -0,0 +1,184 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from texfile import CLUT_SIZE, TexFile, TexWriter, read_index
+from texprof import log, stage
+
+PACK_MAGIC = b'HGPK'
+PACK_VERSION = 1
+
+# Magic, version, number of archives, number of textures
+PACK_HEADER = struct.Struct('<4sIII')
+
+# One entry per archive: its name in the name block and its run of textures
+# in the texture table, which holds every archive's textures in order
+ARCHIVE_DTYPE = np.dtype([
+    ('name_offset', '<u4'),
+    ('name_size', '<u4'),
+    ('first', '<u4'),
+    ('count', '<u4'),
+])
+
+# One entry per texture: the header fields of the TEX file it came from and
+# where its index plane (one byte per pixel, width * height bytes) starts;
+# the 1024-byte raw CLUT follows the plane
+ENTRY_DTYPE = np.dtype([
+    ('archive', '<u4'),
+    ('texture', '<u4'),
+    ('offset', '<u8'),
+    ('size', '<u4'),
+    ('format', '<u4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('unknown', 'u1', 4),
+])
+
+
+# Write the textures of TEX files into one pack file: a fixed-size header,
+# the archive and texture tables, the archive names, then every texture's
+# unpacked index plane and raw CLUT. archives is a list of (name, tex_path).
+# The whole layout comes from the header tables alone and is written first,
+# so textures are streamed out one at a time. Returns the number of textures.
+def export_pack(archives, pack_path):
+    names = [name for name, tex_path in archives]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Archive names in {pack_path} must be unique")
+
+    with stage('read', pack_path):
+        indexes = [read_index(tex_path)[0] for name, tex_path in archives]
+    archive_table = np.zeros(len(archives), dtype=ARCHIVE_DTYPE)
+    entries = np.zeros(sum(len(index) for index in indexes), dtype=ENTRY_DTYPE)
+    encoded_names = [name.encode('utf-8') for name in names]
+    name_offset = 0
+    first = 0
+    for number, (encoded_name, index) in enumerate(zip(encoded_names, indexes)):
+        archive_table[number] = (name_offset, len(encoded_name), first, len(index))
+        run = entries[first:first + len(index)]
+        run['archive'] = number
+        run['texture'] = np.arange(len(index))
+        for field in ('format', 'width', 'height', 'unknown'):
+            run[field] = index[field]
+        name_offset += len(encoded_name)
+        first += len(index)
+    entries['size'] = entries['width'].astype(np.uint32) * entries['height']
+    data_offset = PACK_HEADER.size + archive_table.nbytes + entries.nbytes + name_offset
+    entries['offset'] = data_offset + np.concatenate(([0], np.cumsum(entries['size'] + CLUT_SIZE,
+                                                                      dtype=np.uint64)[:-1]))
+
+    clut_data = bytearray(CLUT_SIZE)
+    try:
+        with open(pack_path, 'wb') as pack_file:
+            pack_file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(archive_table), len(entries)))
+            pack_file.write(archive_table.tobytes())
+            pack_file.write(entries.tobytes())
+            pack_file.write(b''.join(encoded_names))
+            for name, tex_path in archives:
+                with TexFile(tex_path) as tex:
+                    for idx in range(len(tex)):
+                        with stage('decode', tex_path, idx + 1):
+                            indices, mask = tex.indices(idx)
+                            indices[~mask] = 0
+                            # A truncated CLUT is padded with zeros
+                            raw_clut = tex.clut_data(idx)
+                            clut_data[:len(raw_clut)] = raw_clut
+                            clut_data[len(raw_clut):] = bytes(CLUT_SIZE - len(raw_clut))
+                        with stage('write', pack_path, idx + 1):
+                            pack_file.write(indices)
+                            pack_file.write(clut_data)
+                log(2, f"Packed {len(tex)} textures from {tex_path} as {name}")
+    except BaseException:
+        os.remove(pack_path)
+        raise
+    log(1, f"Packed {len(entries)} textures from {len(archives)} TEX files into {pack_path}")
+    return len(entries)
+
+
+# Read-only view of a pack file. Only the tables are parsed on open; index
+# planes and CLUTs are zero-copy views of the mapping, found in O(1) through
+# the archive table, so no image is ever decoded to get at a texture.
+class TexPack:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._map)
+        # Arrays are views of the mapping itself, so releasing data never waits on them
+        try:
+            magic, version, num_archives, num_entries = PACK_HEADER.unpack_from(self.data)
+            if magic != PACK_MAGIC:
+                raise ValueError(f"{path} is not a texture pack")
+            if version != PACK_VERSION:
+                raise ValueError(f"{path} is pack version {version}, expected {PACK_VERSION}")
+            offset = PACK_HEADER.size
+            self.archive_table = np.frombuffer(self._map, dtype=ARCHIVE_DTYPE, count=num_archives, offset=offset)
+            offset += self.archive_table.nbytes
+            self.entries = np.frombuffer(self._map, dtype=ENTRY_DTYPE, count=num_entries, offset=offset)
+            offset += self.entries.nbytes
+            self.names = [bytes(self.data[offset + start:offset + start + size]).decode('utf-8')
+                          for start, size in zip(self.archive_table['name_offset'].tolist(),
+                                                 self.archive_table['name_size'].tolist())]
+            if num_entries and len(self.data) < int(self.entries['offset'][-1] + self.entries['size'][-1]) + CLUT_SIZE:
+                raise ValueError(f"{path} is truncated")
+        except (struct.error, ValueError):
+            self.close()
+            raise
+        self.numbers = {name: number for number, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.archive_table = self.entries = None
+        self.data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Views handed out are still alive; the mapping goes with them
+        self._file.close()
+
+    # Texture table entry of texture idx (0-based) of an archive, by name or number
+    def entry(self, archive, idx):
+        number = self.numbers[archive] if isinstance(archive, str) else archive
+        first, count = int(self.archive_table['first'][number]), int(self.archive_table['count'][number])
+        if not 0 <= idx < count:
+            raise IndexError(f"{self.names[number]} has no texture {idx + 1}")
+        return self.entries[first + idx]
+
+    # Zero-copy (height, width) view of the CLUT indices of a texture
+    def indices(self, archive, idx):
+        entry = self.entry(archive, idx)
+        return np.frombuffer(self._map, dtype=np.uint8, count=int(entry['size']),
+                             offset=int(entry['offset'])).reshape(int(entry['height']), int(entry['width']))
+
+    # Zero-copy view of the raw 1024-byte CLUT of a texture
+    def clut_data(self, archive, idx):
+        entry = self.entry(archive, idx)
+        start = int(entry['offset']) + int(entry['size'])
+        return self.data[start:start + CLUT_SIZE]
+
+    # (format_flag_value, width, height, unknown_bytes) of every texture of an
+    # archive, as TexWriter takes them
+    def layout(self, archive):
+        number = self.numbers[archive] if isinstance(archive, str) else archive
+        first, count = int(self.archive_table['first'][number]), int(self.archive_table['count'][number])
+        run = self.entries[first:first + count]
+        return [(int(entry['format']), int(entry['width']), int(entry['height']), entry['unknown'].tobytes())
+                for entry in run]
+
+
+# Rebuild one archive of a pack as a TEX file; the planes and CLUTs are
+# written back as they are, without going through any image file
+def import_pack(pack, archive, output_tex_file):
+    with TexWriter(output_tex_file, pack.layout(archive)) as writer:
+        for idx in range(len(writer.textures)):
+            writer.write_texture(pack.indices(archive, idx), pack.clut_data(archive, idx))
+    log(1, f"Textures imported from {archive} in {pack.path} and saved to {output_tex_file}")
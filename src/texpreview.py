@@ -0,0 +1,205 @@
+import base64
+import io
+import os
+import sqlite3
+
+import numpy as np
+from PIL import Image
+
+from clut import export_clut
+from texcodec import clut_to_array, unpack_indices
+from texfile import TexFile, read_index
+from texprof import stage
+
+THUMBNAIL_FILE = 'hgtex-thumbnails.sqlite'
+THUMBNAIL_SIZE = 96
+
+
+# Default thumbnail cache directory
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'hgtex')
+
+
+# Every step-th CLUT index of texture idx in both directions. Complete 8bpp
+# data, and 4bpp data of even width sampled at an even step, are sampled
+# straight from the packed bytes, so only the kept pixels are ever unpacked.
+def sample_indices(tex, idx, step):
+    width, height = tex.size(idx)
+    bpp = tex.bpp(idx)
+    pixel_data = tex.pixel_data(idx)
+    if len(pixel_data) == tex.pixel_data_size(idx):
+        data = np.frombuffer(pixel_data, dtype=np.uint8)
+        if bpp == 8:
+            return data.reshape(height, width)[::step, ::step]
+        if width % 2 == 0 and step % 2 == 0:
+            # Even columns are the low nibbles
+            return data.reshape(height, width // 2)[::step, ::step // 2] & 0x0F
+    indices, mask = unpack_indices(pixel_data, width, height, bpp)
+    return np.where(mask, indices, 0)[::step, ::step]
+
+
+# RGBA thumbnail of texture idx at most size pixels on its longer side. The
+# texture is sampled every Nth index before the CLUT lookup, so the cost
+# depends on the thumbnail size rather than the texture size.
+def render_thumbnail(tex, idx, size=THUMBNAIL_SIZE):
+    width, height = tex.size(idx)
+    step = max(1, -(-max(width, height) // size))
+    with stage('decode', tex.path, idx + 1):
+        indices = sample_indices(tex, idx, step)
+        clut = clut_to_array(export_clut(tex.clut(idx)))
+        return Image.fromarray(clut[indices], 'RGBA')
+
+
+# On-disk thumbnail cache, a single SQLite file keyed by archive path,
+# modification time, texture index and size. Entries of an archive that has
+# changed since are simply replaced the next time they are asked for.
+class ThumbnailCache:
+    def __init__(self, cache_dir=None):
+        cache_dir = cache_dir or default_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, THUMBNAIL_FILE), timeout=60)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS thumbnails (path TEXT, texture INTEGER, size INTEGER, '
+                             'mtime_ns INTEGER, png BLOB, PRIMARY KEY (path, texture, size))')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    # PNG bytes of the thumbnail of texture idx (0-based) of the TEX file at
+    # path, rendered and stored on a miss. tex is an optional open TexFile of
+    # that path, to save reopening it for every texture.
+    def get(self, path, idx, size=THUMBNAIL_SIZE, tex=None):
+        path = os.path.abspath(path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        row = self._db.execute('SELECT mtime_ns, png FROM thumbnails WHERE path = ? AND texture = ? AND size = ?',
+                               (path, idx, size)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return row[1]
+
+        if tex is None:
+            with TexFile(path) as tex:
+                image = render_thumbnail(tex, idx, size)
+        else:
+            image = render_thumbnail(tex, idx, size)
+        png = io.BytesIO()
+        image.save(png, 'PNG')
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?)',
+                             (path, idx, size, mtime_ns, png.getvalue()))
+        return png.getvalue()
+
+
+# Tk gallery of every texture in the given TEX files. Only the header tables
+# are read up front; thumbnails are fetched from the cache (and rendered on a
+# miss) for the rows scrolled into view, a few per event loop turn so the
+# window keeps responding. on_close is called after the window is closed.
+class Gallery:
+    def __init__(self, parent, tex_paths, cache, size=THUMBNAIL_SIZE, columns=6, on_close=None):
+        import tkinter as tk
+
+        self.cache = cache
+        self.on_close = on_close
+        self.size = size
+        self.columns = columns
+        self.cell_width = size + 16
+        self.cell_height = size + 36
+        self.entries = []  # (path, idx, label)
+        for path in tex_paths:
+            try:
+                index, declared, file_size = read_index(path)
+            except OSError:
+                continue
+            for idx, (width, height) in enumerate(zip(index['width'].tolist(), index['height'].tolist())):
+                label = f"{os.path.basename(path)} #{idx + 1}\n{width}x{height}"
+                self.entries.append((path, idx, label))
+        self.photos = {}  # Entry number -> PhotoImage, kept alive while shown
+        self.queued = []
+        self.loading = False
+        self.open_file = None  # (path, TexFile) of the last archive rendered from
+
+        self.window = tk.Toplevel(parent)
+        self.window.title(f"Textures ({len(self.entries)})")
+        self.window.geometry(f"{self.cell_width * columns + 24}x600")
+        self.canvas = tk.Canvas(self.window, background='#404040', highlightthickness=0)
+        scrollbar = tk.Scrollbar(self.window, orient='vertical', command=self.scroll)
+        self.canvas.config(yscrollcommand=scrollbar.set,
+                           scrollregion=(0, 0, self.cell_width * columns,
+                                         self.cell_height * -(-len(self.entries) // columns)))
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+        self.canvas.bind('<Configure>', lambda event: self.show_visible())
+        self.canvas.bind_all('<MouseWheel>', lambda event: self.scroll('scroll', -event.delta // 120, 'units'))
+        self.canvas.bind_all('<Button-4>', lambda event: self.scroll('scroll', -1, 'units'))
+        self.canvas.bind_all('<Button-5>', lambda event: self.scroll('scroll', 1, 'units'))
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        for number, (path, idx, label) in enumerate(self.entries):
+            x, y = self.cell_origin(number)
+            self.canvas.create_text(x + size // 2, y + size + 6, text=label, anchor='n',
+                                    fill='white', font=('TkDefaultFont', 7), justify='center')
+
+    def cell_origin(self, number):
+        row, column = divmod(number, self.columns)
+        return column * self.cell_width + 8, row * self.cell_height + 4
+
+    def scroll(self, *args):
+        self.canvas.yview(*args)
+        self.show_visible()
+
+    # Queue the thumbnails of the rows in view and drop the ones far outside it
+    def show_visible(self):
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first = max(0, int(top // self.cell_height) - 1) * self.columns
+        last = min(len(self.entries), (int(bottom // self.cell_height) + 2) * self.columns)
+        for number in list(self.photos):
+            if not first - 4 * self.columns <= number < last + 4 * self.columns:
+                self.canvas.delete(f"thumb{number}")
+                del self.photos[number]
+        self.queued = [number for number in range(first, last) if number not in self.photos]
+        if not self.loading:
+            self.loading = True
+            self.window.after_idle(self.load_queued)
+
+    # Load a few queued thumbnails, then yield to the event loop
+    def load_queued(self):
+        import tkinter as tk
+
+        for _ in range(8):
+            if not self.queued:
+                self.loading = False
+                return
+            number = self.queued.pop(0)
+            if number in self.photos:
+                continue
+            path, idx, label = self.entries[number]
+            try:
+                if self.open_file is None or self.open_file[0] != path:
+                    if self.open_file is not None:
+                        self.open_file[1].close()
+                    self.open_file = (path, TexFile(path))
+                png = self.cache.get(path, idx, self.size, self.open_file[1])
+            except Exception:
+                continue  # Broken textures just show no thumbnail
+            photo = tk.PhotoImage(data=base64.b64encode(png))
+            self.photos[number] = photo
+            x, y = self.cell_origin(number)
+            self.canvas.create_image(x + self.size // 2, y + self.size // 2, image=photo,
+                                     tags=f"thumb{number}")
+        self.window.after(1, self.load_queued)
+
+    def close(self):
+        self.canvas.unbind_all('<MouseWheel>')
+        self.canvas.unbind_all('<Button-4>')
+        self.canvas.unbind_all('<Button-5>')
+        if self.open_file is not None:
+            self.open_file[1].close()
+        self.window.destroy()
+        if self.on_close is not None:
+            self.on_close()
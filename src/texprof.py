@@ -0,0 +1,83 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# How much to print: 0 = errors and summaries only, 1 = one line per file,
+# 2 = every texture with its header details (the default, as it always was)
+verbosity = 2
+
+# The active Timings collector; stage() costs next to nothing while it is None
+timings = None
+
+
+def log(level, message):
+    if verbosity >= level:
+        print(message)
+
+
+# Wall-clock time per pipeline stage (parse, read, decode, clut, encode, pack,
+# write), recorded per texture and per file
+class Timings:
+    def __init__(self):
+        self.records = []  # (stage, file, texture, start, seconds, pid)
+
+    def add(self, records):
+        self.records.extend(records)
+
+    # Total seconds and count per stage, slowest first
+    def totals(self):
+        totals = {}
+        for stage_name, file, texture, start, seconds, pid in self.records:
+            total, count = totals.get(stage_name, (0.0, 0))
+            totals[stage_name] = (total + seconds, count + 1)
+        return sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+
+    # Per-file totals, slowest first
+    def file_totals(self):
+        totals = {}
+        for stage_name, file, texture, start, seconds, pid in self.records:
+            totals[file] = totals.get(file, 0.0) + seconds
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def summary(self, top_files=5):
+        totals = self.totals()
+        grand_total = sum(total for stage_name, (total, count) in totals) or 1.0
+        lines = ["Stage        Calls     Seconds   Share"]
+        for stage_name, (total, count) in totals:
+            lines.append(f"{stage_name:<10} {count:>7} {total:>11.4f} {total / grand_total:>7.1%}")
+        file_totals = self.file_totals()[:top_files]
+        if file_totals:
+            lines.append("Slowest files:")
+            lines.extend(f"  {seconds:.4f}s {file}" for file, seconds in file_totals)
+        return "\n".join(lines)
+
+    # Chrome trace-event JSON (load in chrome://tracing or Perfetto)
+    def write_trace(self, path):
+        events = []
+        for stage_name, file, texture, start, seconds, pid in self.records:
+            events.append({
+                'name': stage_name,
+                'cat': 'tex',
+                'ph': 'X',
+                'ts': round(start * 1e6, 3),
+                'dur': round(seconds * 1e6, 3),
+                'pid': os.getpid(),
+                'tid': pid,  # One row per worker process
+                'args': {'file': file, 'texture': texture},
+            })
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events}, trace_file)
+
+
+# Time a block as one stage of the given file/texture (texture is 1-based)
+@contextmanager
+def stage(name, file=None, texture=None):
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.records.append((name, file, texture, start, time.perf_counter() - start, os.getpid()))
@@ -0,0 +1,73 @@
+from functools import lru_cache
+
+import numpy as np
+
+from clut import rgb_keys
+
+# 4x4 ordered dither thresholds, 0-15
+BAYER4 = np.array([[0, 8, 2, 10],
+                   [12, 4, 14, 6],
+                   [3, 11, 1, 9],
+                   [15, 7, 13, 5]], dtype=np.int16)
+
+
+# Nearest palette index for every 15-bit RGB555 color, measured from the
+# middle of each 8x8x8 cell. Built once per palette (32768 x N distances in
+# chunks) and kept, so remapping a texture is a single table lookup per pixel.
+@lru_cache(maxsize=64)
+def rgb555_lut(palette_bytes):
+    palette = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    levels = (np.arange(32, dtype=np.int32) << 3) | 4
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        chunk = grid[start:start + 4096]
+        distances = ((chunk[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+        lut[start:start + 4096] = distances.argmin(axis=1)
+    lut.setflags(write=False)
+    return lut
+
+
+# Map (height, width, 3) RGB pixels onto an (N, 3) palette, N <= 256. Colors
+# that are in the palette get their lowest index; everything else goes through
+# the RGB555 lookup table, with a 4x4 ordered dither if dither is set.
+def remap(pixels, palette, dither=False):
+    palette = np.ascontiguousarray(palette, dtype=np.uint8).reshape(-1, 3)
+    height, width = pixels.shape[:2]
+
+    unique_keys, first_index = np.unique(rgb_keys(palette), return_index=True)
+    pixel_keys = rgb_keys(pixels)
+    positions = np.minimum(np.searchsorted(unique_keys, pixel_keys), len(unique_keys) - 1)
+    found = unique_keys[positions] == pixel_keys
+    indices = first_index[positions].astype(np.uint8)
+    if found.all():
+        return indices
+
+    rgb = pixels[..., :3].astype(np.int16)
+    if dither:
+        # Spread roughly one palette step either side of each color
+        spread = 128 / len(palette) ** (1 / 3)
+        offsets = ((BAYER4 + 0.5) / 16 - 0.5) * spread
+        rgb = rgb + np.tile(offsets, ((height + 3) // 4, (width + 3) // 4))[:height, :width, None].astype(np.int16)
+        np.clip(rgb, 0, 255, out=rgb)
+    rgb = rgb.astype(np.uint16)
+    keys = ((rgb[..., 0] >> 3) << 10) | ((rgb[..., 1] >> 3) << 5) | (rgb[..., 2] >> 3)
+    lut = rgb555_lut(palette.tobytes())
+    indices[~found] = lut[keys[~found]]
+    return indices
+
+
+# A new num_colors palette for an RGB image (median cut), as an (N, 3) array.
+# Big images are sampled down to about 16K pixels first, which gives much the
+# same palette in a fraction of the time.
+def quantize_palette(image, num_colors):
+    from PIL import Image
+
+    rgb = np.asarray(image.convert('RGB'))
+    step = max(1, int(np.sqrt(rgb.shape[0] * rgb.shape[1] / 16384)))
+    sample = Image.fromarray(np.ascontiguousarray(rgb[::step, ::step]))
+    quantized = sample.quantize(colors=num_colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    palette = np.zeros((num_colors, 3), dtype=np.uint8)
+    colors = np.asarray(quantized.getpalette()[:num_colors * 3], dtype=np.uint8).reshape(-1, 3)
+    palette[:len(colors)] = colors
+    return palette
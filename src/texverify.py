@@ -0,0 +1,100 @@
+import numpy as np
+
+from clut import export_clut
+from texcodec import clut_to_array
+from texfile import TexFile
+from texprof import log, stage
+
+HEADER_FIELDS = ('format', 'width', 'height', 'unknown')
+
+
+# Bounding box (x0, y0, x1, y1), inclusive, of the True cells of a 2D mask
+def region(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    columns = np.flatnonzero(mask.any(axis=0))
+    return int(columns[0]), int(rows[0]), int(columns[-1]), int(rows[-1])
+
+
+# Compare texture idx of two open TexFiles. Identical pixel and CLUT bytes
+# are accepted after a single comparison; otherwise the CLUT indices, CLUT
+# entries and decoded colors are compared as whole arrays. With decoded set,
+# only the decoded colors have to match (within tolerance per channel), so
+# a reordered palette passes. Returns a list of differences, empty if the
+# textures match.
+def compare_texture(original, rebuilt, idx, decoded=False, tolerance=0):
+    differences = []
+    for field in HEADER_FIELDS:
+        a, b = original.index[field][idx], rebuilt.index[field][idx]
+        if not np.array_equal(a, b):
+            differences.append(f"{field} {np.asarray(a).tolist()} != {np.asarray(b).tolist()}")
+    if differences:
+        return differences  # Different layouts can't be compared pixel by pixel
+
+    if original.pixel_data(idx) == rebuilt.pixel_data(idx) and original.clut_data(idx) == rebuilt.clut_data(idx):
+        return differences
+
+    indices_a, mask_a = original.indices(idx)
+    indices_b, mask_b = rebuilt.indices(idx)
+    clut_a = clut_to_array(export_clut(original.clut(idx)))
+    clut_b = clut_to_array(export_clut(rebuilt.clut(idx)))
+    colors_a = clut_a[indices_a]
+    colors_a[~mask_a] = 0
+    colors_b = clut_b[indices_b]
+    colors_b[~mask_b] = 0
+    error = np.abs(colors_a.astype(np.int16) - colors_b.astype(np.int16)).max(axis=2)
+    wrong_colors = error > tolerance
+
+    if wrong_colors.any():
+        x0, y0, x1, y1 = region(wrong_colors)
+        differences.append(f"{int(wrong_colors.sum())} pixels decode to different colors "
+                           f"(max error {int(error.max())}) in ({x0}, {y0})-({x1}, {y1})")
+    if decoded:
+        return differences
+
+    wrong_indices = (indices_a != indices_b) | (mask_a != mask_b)
+    if wrong_indices.any():
+        x0, y0, x1, y1 = region(wrong_indices)
+        differences.append(f"{int(wrong_indices.sum())} pixel indices differ in ({x0}, {y0})-({x1}, {y1})")
+    raw_a = np.frombuffer(original.clut_data(idx), dtype=np.uint8)
+    raw_b = np.frombuffer(rebuilt.clut_data(idx), dtype=np.uint8)
+    if len(raw_a) != len(raw_b):
+        differences.append(f"CLUT is {len(raw_a)} bytes != {len(raw_b)}")
+    elif not np.array_equal(raw_a, raw_b):
+        entries = np.flatnonzero((raw_a.reshape(-1, 4) != raw_b.reshape(-1, 4)).any(axis=1))
+        alpha_only = np.array_equal(raw_a.reshape(-1, 4)[:, :3], raw_b.reshape(-1, 4)[:, :3])
+        listed = ', '.join(str(entry) for entry in entries[:8]) + (', ...' if len(entries) > 8 else '')
+        differences.append(f"{len(entries)} CLUT entries differ{' (alpha only)' if alpha_only else ''}: {listed}")
+    if not differences:
+        differences.append("pixel data differs outside the image (padding or odd-width nibbles)")
+    return differences
+
+
+# Compare two TEX files texture by texture through their header indexes; data
+# offsets may differ, everything else has to match. Identical files are
+# accepted after one comparison of the whole mapping. A texture that can't be
+# decoded (an unsupported format flag) is reported as a difference. Returns
+# the list of differences, each prefixed with its texture number.
+def verify_tex(original_file, rebuilt_file, decoded=False, tolerance=0):
+    differences = []
+    with stage('parse', original_file):
+        original = TexFile(original_file)
+        rebuilt = TexFile(rebuilt_file)
+    with original, rebuilt:
+        if original.data == rebuilt.data:
+            log(1, f"{rebuilt_file}: matches {original_file}")
+            return differences
+        if len(original) != len(rebuilt):
+            differences.append(f"{len(original)} textures != {len(rebuilt)}")
+        for idx in range(min(len(original), len(rebuilt))):
+            with stage('verify', original_file, idx + 1):
+                try:
+                    texture_differences = compare_texture(original, rebuilt, idx, decoded, tolerance)
+                except ValueError as e:
+                    texture_differences = [str(e)]
+            differences += [f"texture {idx + 1}: {difference}" for difference in texture_differences]
+            log(2, f"Texture {idx + 1}: {'OK' if not texture_differences else 'differs'}")
+
+    for difference in differences:
+        log(0, f"{rebuilt_file}: {difference}")
+    log(1, f"{rebuilt_file}: {'matches' if not differences else 'differs from'} {original_file}")
+    return differences
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import texprof
+from hgtex import TEXTURE_NAME, import_tex
+from texcache import TexCache
+from texprof import log
+
+# <stem>_textureN.bmp/.png, <stem>_textureN_clut.bin and <stem>.texinfo.json
+WATCHED_NAME = re.compile(r'(.+?)(?:_texture\d+(?:_clut)?|\.texinfo)$', re.IGNORECASE)
+WATCHED_EXTENSIONS = ('.bmp', '.png', '.bin', '.json')
+
+# Cache connections of this process, one per cache directory
+open_caches = {}
+
+
+# (mtime_ns, size) of every watched file under the roots
+def snapshot(roots):
+    files = {}
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.lower().endswith(WATCHED_EXTENSIONS):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue  # Deleted since the listing
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+# The (directory, stem) archive a watched file belongs to, or None
+def archive_of(path):
+    match = WATCHED_NAME.match(os.path.splitext(os.path.basename(path))[0])
+    if match is None:
+        return None
+    return os.path.dirname(path), match.group(1)
+
+
+# Worker task: rebuild one archive from the images in its directory, with the
+# headers from a reference TEX or, without one, from <stem>.texinfo.json.
+# Returns (output, error, seconds).
+def rebuild_task(task):
+    directory, stem, reference_tex_file, output_tex_file, cache_dir, dither, verbosity = task
+    texprof.verbosity = verbosity
+    start = time.perf_counter()
+    try:
+        if cache_dir and cache_dir not in open_caches:
+            open_caches[cache_dir] = TexCache(cache_dir)
+        os.makedirs(os.path.dirname(output_tex_file) or '.', exist_ok=True)
+        if reference_tex_file is None:
+            import_tex(None, os.path.join(directory, f"{stem}.texinfo.json"), output_tex_file,
+                       open_caches.get(cache_dir), dither=dither)
+        else:
+            images = []
+            for name in os.listdir(directory):
+                match = TEXTURE_NAME.match(os.path.splitext(name)[0])
+                if match and match.group(1).lower() == stem.lower() and name.lower().endswith(('.bmp', '.png')):
+                    images.append(os.path.join(directory, name))
+            import_tex(images, reference_tex_file, output_tex_file, open_caches.get(cache_dir), dither=dither)
+        return output_tex_file, None, time.perf_counter() - start
+    except Exception as e:
+        return output_tex_file, str(e), time.perf_counter() - start
+
+
+# Watch directories of exported images and rebuild the TEX archives whose
+# images, CLUT or texinfo files change. The directories are polled every
+# interval seconds; an archive is rebuilt once its files have been quiet for
+# debounce seconds, so a burst of saves costs one rebuild. Rebuilds run on a
+# process pool, several archives at once, and an archive changed during its
+# own rebuild is simply rebuilt again. Archives whose output is missing or
+# older than their inputs are rebuilt on start. Outputs mirror the watched
+# tree under out_dir. references is an optional directory of reference TEX
+# files; without it every archive needs its .texinfo.json. Runs until
+# interrupted, or for max_polls polls.
+def watch(roots, out_dir, references=None, interval=0.25, debounce=0.3, workers=None, cache_dir=None,
+          dither=False, max_polls=None):
+    reference_files = {}
+    if references:
+        for dirpath, dirnames, filenames in os.walk(references):
+            for filename in filenames:
+                if filename.lower().endswith('.tex'):
+                    reference_files.setdefault(os.path.splitext(filename)[0].lower(),
+                                               os.path.join(dirpath, filename))
+
+    def archive_task(root, directory, stem):
+        reference_tex_file = None
+        if references:
+            reference_tex_file = reference_files.get(stem.lower())
+            if reference_tex_file is None:
+                return None
+            archive = os.path.basename(reference_tex_file)
+        elif os.path.exists(os.path.join(directory, f"{stem}.texinfo.json")):
+            archive = f"{stem}.TEX"
+            try:
+                with open(os.path.join(directory, f"{stem}.texinfo.json")) as texinfo_input:
+                    archive = json.load(texinfo_input).get('archive', archive)
+            except (OSError, ValueError):
+                pass
+        else:
+            return None
+        output_tex_file = os.path.normpath(os.path.join(out_dir, os.path.relpath(directory, root), archive))
+        return directory, stem, reference_tex_file, output_tex_file, cache_dir, dither, texprof.verbosity
+
+    roots = [os.path.normpath(root) for root in roots]
+
+    def root_of(directory):
+        for root in roots:
+            if os.path.commonpath([root, directory]) == root:
+                return root
+        return roots[0]
+
+    files = snapshot(roots)
+    pending = {}  # (directory, stem) -> time of the last change
+    newest = {}
+    for path, (mtime_ns, size) in files.items():
+        archive = archive_of(path)
+        if archive is not None:
+            newest[archive] = max(newest.get(archive, 0), mtime_ns)
+    for archive, mtime_ns in newest.items():
+        task = archive_task(root_of(archive[0]), *archive)
+        if task is not None:
+            output_tex_file = task[3]
+            if not os.path.exists(output_tex_file) or os.stat(output_tex_file).st_mtime_ns < mtime_ns:
+                pending[archive] = 0.0
+
+    running = {}  # future -> archive
+    polls = 0
+    log(0, f"Watching {', '.join(roots)} (Ctrl+C to stop)")
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        try:
+            while max_polls is None or polls < max_polls or running:
+                now = time.monotonic()
+                # Start rebuilds of archives that have been quiet long enough
+                busy = set(running.values())
+                for archive, changed in list(pending.items()):
+                    if archive in busy or now - changed < debounce:
+                        continue
+                    del pending[archive]
+                    task = archive_task(root_of(archive[0]), *archive)
+                    if task is not None:
+                        running[pool.submit(rebuild_task, task)] = archive
+
+                # Report finished rebuilds
+                for future in [future for future in running if future.done()]:
+                    del running[future]
+                    output_tex_file, error, seconds = future.result()
+                    if error:
+                        log(0, f"Error rebuilding {output_tex_file}: {error}")
+                    else:
+                        log(0, f"Rebuilt {output_tex_file} in {seconds:.2f}s")
+
+                time.sleep(interval)
+                polls += 1
+                current = snapshot(roots)
+                changed = {path for path in files.keys() | current.keys() if files.get(path) != current.get(path)}
+                files = current
+                for path in changed:
+                    archive = archive_of(path)
+                    if archive is not None:
+                        pending[archive] = time.monotonic()
+        except KeyboardInterrupt:
+            log(0, "Stopped watching")
+            for future in running:
+                future.cancel()